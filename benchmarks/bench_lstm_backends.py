@@ -0,0 +1,120 @@
+# Benchmark of the LSTM inference backends: torch (lstm_model) vs NumPy (lstm_numpy)
+#
+# Cold start (import + load + first prediction) and peak RSS are measured in a fresh interpreter per
+# backend; latency is measured in this process on windows sampled over the scaler's data range.
+#
+# Usage: python benchmarks/bench_lstm_backends.py [--repeat 200] [--batch 1024]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Backend name -> (module, loader, batch predictor)
+BACKENDS = {
+    "torch": ("lstm_model", "load_LSTM", "predict_batch"),
+    "numpy": ("lstm_numpy", "load_numpy_LSTM", "predict_batch_numpy"),
+}
+
+# Run in a fresh interpreter: import, load and predict one window, then report time and peak RSS
+COLD_START = """
+import json, resource, sys, time, warnings
+warnings.simplefilter("ignore")
+
+# Peak RSS of this interpreter only (ru_maxrss also counts the parent before exec on Linux)
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            return next(int(line.split()[1]) for line in status if line.startswith("VmHWM")) / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+start = time.perf_counter()
+module = __import__({module!r})
+model, scaler = getattr(module, {loader!r})()
+getattr(module, {predict!r})(model, scaler, __import__("numpy").full((1, module.WINDOW_SIZE, 9), 30.0))
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "rss_mb": peak_rss_mb(),
+                  "torch_loaded": "torch" in sys.modules}}))
+"""
+
+
+def cold_start(name):
+    module, loader, predict = BACKENDS[name]
+    output = subprocess.run([sys.executable, "-c", COLD_START.format(module=module, loader=loader, predict=predict)],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+# Windows of raw bars spread over the range the scaler was fitted on (latest day first)
+
+
+def sample_windows(scaler, n_windows, seed=0):
+    low = -scaler.min_ / scaler.scale_
+    high = (1 - scaler.min_) / scaler.scale_
+    unit = np.random.default_rng(seed).random(
+        (n_windows, 10, len(scaler.scale_)))
+    return low + unit * (high - low)
+
+
+def latency(predict, model, scaler, windows, repeat):
+    predict(model, scaler, windows)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        predict(model, scaler, windows)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the torch and NumPy LSTM inference backends.")
+    parser.add_argument("--repeat", type=int, default=200,
+                        help="timed calls per measurement")
+    parser.add_argument("--batch", type=int, default=1024,
+                        help="windows per call in the batched measurement")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    import lstm_model
+    import lstm_numpy
+
+    # Export the current artifacts aside, the committed .npz is left untouched
+    with tempfile.TemporaryDirectory() as directory:
+        npz_path = os.path.join(directory, "lstm_model_weights.npz")
+        lstm_model.export_numpy(npz_path)
+        numpy_model, numpy_scaler, _ = lstm_numpy.load_npz(npz_path)
+
+    loaded = {
+        "torch": (lstm_model.predict_batch, *lstm_model.load_LSTM()),
+        "numpy": (lstm_numpy.predict_batch_numpy, numpy_model, numpy_scaler),
+    }
+
+    scaler = loaded["torch"][2]
+    single = sample_windows(scaler, 1)
+    batch = sample_windows(scaler, args.batch, seed=1)
+
+    outputs = {name: predict(model, scaler, batch)[1]
+               for name, (predict, model, scaler) in loaded.items()}
+    drift = np.abs(outputs["torch"] - outputs["numpy"]).max()
+
+    print(f"{'backend':<10}{'cold s':>10}{'RSS MB':>10}{'torch':>8}{'1 window ms':>14}{'per window us':>16}")
+    for name, (predict, model, backend_scaler) in loaded.items():
+        cold = cold_start(name)
+        one = latency(predict, model, backend_scaler, single, args.repeat)
+        many = latency(predict, model, backend_scaler, batch,
+                       max(1, args.repeat // 20))
+        print(f"{name:<10}{cold['seconds']:>10.2f}{cold['rss_mb']:>10.0f}{str(cold['torch_loaded']):>8}"
+              f"{one * 1000:>14.3f}{many / args.batch * 1e6:>16.2f}")
+
+    print(f"Max predicted price difference over {args.batch} windows: {drift:.2f}")
+
+
+if __name__ == "__main__":
+    main()
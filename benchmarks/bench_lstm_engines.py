@@ -0,0 +1,63 @@
+# Throughput of the LSTM execution engines (lstm_model.ENGINES) for several batch sizes, with each
+# engine's price drift from the float model over the scaler's data range
+#
+# Usage: python benchmarks/bench_lstm_engines.py [--batches 1 64 1024] [--seconds 1.0]
+import argparse
+import os
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Run the engine for at least 'seconds' and return the windows scored per second
+
+
+def throughput(engine, windows_scaled, seconds):
+    engine(windows_scaled)  # warm up
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        engine(windows_scaled)
+        calls += 1
+    return calls * len(windows_scaled) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the LSTM execution engines.")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 64, 1024],
+                        help="batch sizes (windows per call)")
+    parser.add_argument("--seconds", type=float, default=1.0,
+                        help="timed duration per measurement")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    warnings.simplefilter("ignore")
+    import lstm_model
+
+    model, scaler = lstm_model.load_LSTM()
+    rng = np.random.default_rng(0)
+
+    header = "".join(f"{f'batch {size} win/s':>18}" for size in args.batches)
+    print(f"{'engine':<14}{'drift SAR':>12}{header}")
+    for name in lstm_model.ENGINES:
+        try:
+            engine = lstm_model.get_engine(name, model, scaler)
+        except (ImportError, ValueError) as error:
+            print(f"{name:<14}unavailable: {error}")
+            continue
+
+        drift = lstm_model.check_drift(name, engine, model, scaler)
+        rates = "".join(
+            f"{throughput(engine, rng.random((size, lstm_model.WINDOW_SIZE, len(scaler.scale_)), dtype=np.float32), args.seconds):>18,.0f}"
+            for size in args.batches)
+        print(f"{name:<14}{drift:>12.4f}{rates}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# Offline benchmark of the data path: exchange pages -> bar store -> LSTM window -> predicted price
+#
+# Record the exchange pages once (live, or from a synthetic exchange when there is no network),
+# then replay them locally as many times as needed with an injected per-page latency:
+#
+#   python benchmarks/bench_pipeline.py record --out recordings/tasi [--synthetic] [--end-date 14-09-2025] [--days 20]
+#   python benchmarks/bench_pipeline.py replay --recording recordings/tasi [--latency 0.05] [--iterations 5]
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import tasi_api  # noqa: E402
+from bench_preprocess import synthetic_row  # noqa: E402
+from lstm_model import WINDOW_SIZE, load_LSTM, predict_price  # noqa: E402
+
+# Run settings saved next to the recorded pages, so the replay issues the same requests
+MANIFEST = "manifest.json"
+
+
+class SyntheticExchange:
+    """Answers page requests like the exchange does, with generated bars for every Sunday to Thursday."""
+
+    rate_limited = False
+
+    def fetch(self, payload):
+        start = datetime.strptime(payload["startDate"], "%d-%m-%Y").date()
+        day = datetime.strptime(payload["endDate"], "%d-%m-%Y").date()
+
+        rows = []
+        while day >= start:
+            if day.weekday() not in (4, 5):
+                rows.append(synthetic_row(day, day.toordinal()))
+            day -= timedelta(days=1)
+
+        offset, length = int(payload["start"]), int(payload["length"])
+        return {"draw": payload["draw"], "recordsTotal": len(rows), "recordsFiltered": len(rows),
+                "data": rows[offset:offset + length]}
+
+
+class CountingTransport:
+    """Counts the pages requested through another transport."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.rate_limited = inner.rate_limited
+        self.pages = 0
+
+    def fetch(self, payload):
+        self.pages += 1
+        return self.inner.fetch(payload)
+
+# The last 'n_days' trading days (Sunday to Thursday) up to end_date ('DD-MM-YYYY')
+
+
+def trading_days(end_date, n_days):
+    day = datetime.strptime(end_date, "%d-%m-%Y")
+    days = []
+    while len(days) < n_days:
+        if day.weekday() not in (4, 5):
+            days.append(day.strftime("%d-%m-%Y"))
+        day -= timedelta(days=1)
+    return days[::-1]
+
+# Run the data path for one day against an empty bar store, so every bar goes through the transport.
+# Returns the (fetch, predict) durations in seconds.
+
+
+def run_day(model, scaler, end_date):
+    with tempfile.TemporaryDirectory() as directory:
+        tasi_api.MARKET_DB = os.path.join(directory, "market_data.db")
+
+        start = time.perf_counter()
+        data = tasi_api.fetch_latest(end_date, WINDOW_SIZE + 1)
+        fetched = time.perf_counter()
+
+        # Same split as apply_framework: the newest bar is the actual day
+        with contextlib.redirect_stdout(io.StringIO()):
+            predict_price(model, scaler, data.drop(data[:1].index))
+        predicted = time.perf_counter()
+
+    return fetched - start, predicted - fetched
+
+
+def record(args):
+    inner = SyntheticExchange() if args.synthetic else tasi_api.LiveTransport()
+    tasi_api.set_transport(tasi_api.RecordingTransport(args.out, inner))
+
+    days = trading_days(args.end_date, args.days)
+    with open(os.path.join(args.out, MANIFEST), "w", encoding="utf-8") as file:
+        json.dump({"days": days, "synthetic": args.synthetic}, file, indent=2)
+
+    model, scaler = load_LSTM()
+    for end_date in days:
+        run_day(model, scaler, end_date)
+
+    print(f"Recorded {len(days)} days to {args.out}")
+
+
+def replay(args):
+    with open(os.path.join(args.recording, MANIFEST), "r", encoding="utf-8") as file:
+        days = json.load(file)["days"]
+
+    transport = CountingTransport(
+        tasi_api.ReplayTransport(args.recording, args.latency))
+    tasi_api.set_transport(transport)
+
+    model, scaler = load_LSTM()
+    fetch_times, predict_times = [], []
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for end_date in days:
+            fetch_time, predict_time = run_day(model, scaler, end_date)
+            fetch_times.append(fetch_time)
+            predict_times.append(predict_time)
+    elapsed = time.perf_counter() - start
+
+    def row(name, times):
+        times = sorted(times)
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+        return f"{name:<10}{statistics.mean(times) * 1000:>10.2f}{statistics.median(times) * 1000:>10.2f}{p95 * 1000:>10.2f}"
+
+    runs = len(fetch_times)
+    print(f"Runs: {runs:,} ({len(days)} days x {args.iterations} iterations), "
+          f"pages: {transport.pages:,}, injected latency: {args.latency * 1000:.0f} ms/page")
+    print(f"{'stage':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    print(row("fetch", fetch_times))
+    print(row("predict", predict_times))
+    print(row("total", [f + p for f, p in zip(fetch_times, predict_times)]))
+    print(f"Throughput: {runs / elapsed:,.1f} predictions/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the fetch -> preprocess -> predict path from recorded exchange pages.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser(
+        "record", help="record the exchange pages of a run")
+    record_parser.add_argument("--out", required=True,
+                               help="directory for the recorded pages")
+    record_parser.add_argument("--synthetic", action="store_true",
+                               help="record a synthetic exchange instead of saudiexchange.sa")
+    record_parser.add_argument("--end-date", default=datetime.now().strftime("%d-%m-%Y"),
+                               help="last day to predict (DD-MM-YYYY)")
+    record_parser.add_argument("--days", type=int, default=20,
+                               help="number of trading days to predict")
+
+    replay_parser = commands.add_parser(
+        "replay", help="benchmark a recorded run offline")
+    replay_parser.add_argument("--recording", required=True,
+                               help="directory of recorded pages")
+    replay_parser.add_argument("--latency", type=float, default=0.0,
+                               help="injected latency per page (seconds)")
+    replay_parser.add_argument("--iterations", type=int, default=5,
+                               help="number of times the recorded days are replayed")
+
+    args = parser.parse_args()
+
+    # Resolve paths before moving to the repo root, where the LSTM artifacts live
+    for name in ("out", "recording"):
+        if getattr(args, name, None):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    os.chdir(ROOT)
+
+    if args.command == "record":
+        record(args)
+    else:
+        replay(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Benchmark of the exchange rows parsing: legacy per-cell BeautifulSoup parsing vs vectorized regex parsing
+#
+# Usage: python benchmarks/bench_preprocess.py [--payload rows.json] [--rows 100000]
+import argparse
+import json
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tasi_api import BAR_COLUMNS, parse_rows  # noqa: E402
+
+# Legacy parser (one BeautifulSoup parser per cell, chained str.replace passes)
+
+
+def legacy_extract_change(html_str):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_str, "html.parser")
+    div = soup.find("div", class_="priceDown") or soup.find(
+        "div", class_="priceUp")
+    return float(div.text) if div else 0.0
+
+
+def legacy_parse_rows(days):
+    days = days.rename(columns={
+        "todaysOpen": "Open",
+        "highPrice": "High",
+        "lowPrice": "Low",
+        "previousClosePrice": "Close",
+        "volumeTraded": "Volume",
+        "turnOver": "Turnover",
+        "noOfTrades": "NoOfTrades",
+        "transactionDateStr": "Date"
+    })
+    days["Date"] = pd.to_datetime(
+        days["Date"], format="%Y-%m-%d", errors='coerce')
+    days = days[['Date'] + BAR_COLUMNS].copy()
+
+    days["change"] = days["change"].apply(legacy_extract_change)
+    days["changePercent"] = days["changePercent"].apply(
+        lambda s: legacy_extract_change(s.strip('%')))
+
+    for col in ["Open", "High", "Low", "Close", "change", "changePercent"]:
+        days[col] = pd.to_numeric(days[col], errors="coerce")
+
+    for col in ["Volume", "Turnover", "NoOfTrades"]:
+        days[col] = (
+            days[col]
+            .astype(str)
+            .str.replace(",", "", regex=False)
+            .str.replace("-", "", regex=False)
+            .str.replace("\u00a0", "", regex=False)
+            .str.strip()
+        )
+        days[col] = pd.to_numeric(days[col], errors="coerce")
+
+    days.set_index('Date', inplace=True)
+    return days.sort_index(ascending=False)
+
+# One row in the exchange format for the given day
+
+
+def synthetic_row(day, i):
+    price = 24 + (i % 50) / 100
+    up = i % 3 != 0
+    direction = "priceUp" if up else "priceDown"
+    sign = "" if up else "-"
+    return {
+        "transactionDate": day.isoformat(),
+        "transactionDateStr": day.isoformat(),
+        "todaysOpen": f"{price:.2f}",
+        "highPrice": f"{price + 0.1:.2f}",
+        "lowPrice": f"{price - 0.1:.2f}",
+        "previousClosePrice": f"{price:.2f}",
+        "lastTradePrice": f"{price:.2f}",
+        "change": f'<div class="{direction}">{sign}0.{i % 90 + 10}</div>',
+        "changePercent": f'<div class="{direction}">{sign}0.{i % 90 + 10}</div>%',
+        "volumeTraded": f"{12_345_678 + i:,}",
+        "turnOver": f"{298_765_432.5 + i:,.2f}",
+        "noOfTrades": "-" if i % 97 == 0 else f"{25_000 + i:,}",
+    }
+
+# Rows in the exchange format, used when no recorded payload is given
+
+
+def synthetic_rows(n_rows):
+    day = date(2025, 9, 14)
+    return [synthetic_row(day - timedelta(days=i), i) for i in range(n_rows)]
+
+# Load recorded rows (a list of rows, a page {"data": [...]}, or a list of pages)
+
+
+def load_payload(path):
+    with open(path, "r", encoding="utf-8") as file:
+        payload = json.load(file)
+
+    if isinstance(payload, dict):
+        return payload.get("data", [])
+    if payload and isinstance(payload[0], dict) and "data" in payload[0]:
+        return [row for page in payload for row in page["data"]]
+    return payload
+
+
+def time_parser(parser, rows):
+    start = time.perf_counter()
+    bars = parser(pd.DataFrame(rows))
+    return bars, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the exchange rows parsing (legacy vs vectorized).")
+    parser.add_argument("--payload", help="recorded JSON rows to replay")
+    parser.add_argument("--rows", type=int, default=100_000,
+                        help="number of rows (recorded rows are repeated)")
+    args = parser.parse_args()
+
+    base = load_payload(args.payload) if args.payload else synthetic_rows(
+        min(args.rows, 5000))
+    rows = (base * (args.rows // len(base) + 1))[:args.rows]
+
+    new_bars, new_time = time_parser(parse_rows, rows)
+    legacy_bars, legacy_time = time_parser(legacy_parse_rows, rows)
+
+    same = legacy_bars.reset_index(drop=True).equals(
+        new_bars.reset_index(drop=True))
+
+    print(f"Rows parsed: {len(rows):,}")
+    print(f"{'parser':<12}{'seconds':>10}{'rows/s':>14}")
+    print(f"{'legacy':<12}{legacy_time:>10.3f}{len(rows) / legacy_time:>14,.0f}")
+    print(f"{'vectorized':<12}{new_time:>10.3f}{len(rows) / new_time:>14,.0f}")
+    print(f"Speed-up: {legacy_time / new_time:.1f}x, identical output: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,30 @@
+import io
+import os
 import torch
 from torch import nn
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 import joblib
+from lstm_numpy import (ModelRegistry, NumpyLSTM, NPZ_PATH, SCALER_PATH, STD_PATH, TARGET_COLUMN,
+                        WEIGHTS_PATH, WINDOW_SIZE, finish_predictions, load_npz, prepare_windows,
+                        unscale_target)
+
+# Windows scored per forward pass by forecast_history
+FORECAST_BATCH_SIZE = 4096
+
+# Execution engines of the LSTM, selected with the LSTM_ENGINE environment variable (float by default)
+ENGINES = ["float", "torchscript", "int8", "onnx", "numpy"]
+LSTM_ENGINE = os.getenv("LSTM_ENGINE", "float")
+
+# Maximum predicted price difference (SAR) accepted between an engine and the float model
+ENGINE_TOLERANCE = {
+    "float": 0.0,
+    "torchscript": 0.001,
+    "int8": 0.25,
+    "onnx": 0.001,
+    "numpy": 0.001,
+}
 
 
 class LSTMModel(nn.Module):
@@ -17,65 +40,233 @@ class LSTMModel(nn.Module):
         out = self.dropout(out[:, -1, :])
         return self.fc(out)
 
-# Function define, load the model and scaler
 
+# Build the model (in eval mode), scaler and std from the saved artifacts
 
-def load_LSTM():
 
+def load_artifacts(weights_path, scaler_path, std_path):
     # Load the model architecture and weights
     model = LSTMModel()
-    model.load_state_dict(torch.load("lstm_model_weights.pth"))
+    model.load_state_dict(torch.load(weights_path))
+    model.eval()
 
     # Load the scaler to transform the input data
-    scaler = joblib.load('lstm_scaler.pkl')
+    scaler = joblib.load(scaler_path)
+
+    # Get the testing standard deviation
+    std = pd.read_csv(std_path)["Std"].values[0]
+
+    return model, scaler, std
+
+
+_registry = ModelRegistry(load_artifacts, (WEIGHTS_PATH, SCALER_PATH, STD_PATH))
+
+# Function define, load the model and scaler (cached, reloaded only when the artifacts change)
+
+
+def load_LSTM():
+    registry = _registry.refresh()
+    return [registry.model, registry.scaler]
+
+# Testing standard deviation of the current artifacts, used for the prediction intervals
+
+
+def get_std():
+    return _registry.refresh().std
 
-    return [model, scaler]
+# Version (content hash) of the loaded artifacts
+
+
+def model_version():
+    return _registry.refresh().version
+
+# Predict the next price of many windows in a single forward pass.
+# 'windows' is a list of DataFrames shaped like predict_price's input (latest day first), or an
+# array of shape (N, WINDOW_SIZE, features) in the same order.
+# Returns arrays of today's price, predicted price, change percentage and prediction interval bounds
+
+
+def predict_batch(model, scaler, windows, engine=None):
+    windows, windows_scaled, target_index = prepare_windows(scaler, windows)
+
+    # Run the selected engine on float32 windows
+    run = get_engine(engine or LSTM_ENGINE, model, scaler)
+    price_pred = run(windows_scaled.reshape(
+        -1, WINDOW_SIZE, windows_scaled.shape[2]).astype(np.float32))
+
+    return finish_predictions(scaler, windows, price_pred, target_index, get_std())
 
 # Function to process the data then predict the next price using the LSTM
 
 
 def predict_price(model, scaler, window_data):
+    today_price, pred_inv, change, lower, upper = predict_batch(
+        model, scaler, [window_data])
+
+    print(f"Next estimated Stock Price: {pred_inv[0]}")
 
-    # Reorder the data to start from the oldest date
-    window_reverse = window_data.iloc[::-1].reset_index(drop=True)
+    # Return a list of today's price, predicted price, change percentage, and prediction interval bounds
+    return [today_price[0], pred_inv[0], change[0], lower[0], upper[0]]
 
-    # Scale features
-    window_scaled = scaler.transform(window_reverse)
+# Score every sliding window of a full price history (bars indexed by date, any order), in batched
+# passes over zero-copy strided views of the history.
+# Returns one row per window, indexed by its latest date: today's price, the prediction for the next
+# trading day with its interval, and the actual next close when it is known
 
-    # Determine target column index
-    target_col = 'Close'
-    target_index = window_reverse.columns.get_loc(target_col)
 
-    # Convert to tensors
-    window_tensor = torch.tensor(window_scaled.reshape(
-        1, 10, window_scaled.shape[1]), dtype=torch.float32)
+def forecast_history(model, scaler, history, engine=None, batch_size=FORECAST_BATCH_SIZE):
+    columns = ["Today_Price", "Predicted_Price",
+               "Predicted_Change_Percentage", "Lower_Bound", "Upper_Bound"]
 
-    # Test
-    model.eval()
-    with torch.no_grad():
-        price_pred = model(window_tensor).squeeze().numpy()
+    history = history.sort_index()
+    if len(history) < WINDOW_SIZE:
+        return pd.DataFrame(columns=columns + ["Next_Close"], index=history.index[:0])
 
-    # Inverse transform the predicted value
-    # Get the last input for inverse transformation
-    last_input = window_scaled[-1].copy()
-    # Set the predicted value in the last input
-    last_input[target_index] = price_pred
+    values = history[list(scaler.feature_names_in_)].to_numpy(dtype=np.float64)
 
-    # Save last known day stock price to compute change percentage calculation
-    today_price = window_data["Close"].iloc[0]
+    # (windows, features, days) view, reordered to (windows, days, features) latest day first
+    windows = sliding_window_view(values, WINDOW_SIZE, axis=0).transpose(0, 2, 1)[:, ::-1, :]
 
-    pred_inv = round(scaler.inverse_transform(
-        last_input.reshape(1, -1))[0, target_index], 2)
-    change = round(((pred_inv - today_price)/today_price) * 100, 2)
+    batches = [predict_batch(model, scaler, windows[start:start + batch_size], engine)
+               for start in range(0, len(windows), batch_size)]
+    forecast = pd.DataFrame(
+        {column: np.concatenate([batch[i] for batch in batches]) for i, column in enumerate(columns)},
+        index=history.index[WINDOW_SIZE - 1:])
 
-    print(f"Next estimated Stock Price: {pred_inv}")
+    # The next trading day's close, to score the forecast (unknown for the latest window)
+    forecast["Next_Close"] = history[TARGET_COLUMN].shift(-1).iloc[WINDOW_SIZE - 1:].to_numpy()
 
-    # Get the testing standard deviation
-    std = pd.read_csv("lstm_std.csv")["Std"].values[0]
+    return forecast
 
-    # Compute prediction intervals
-    lower = round(pred_inv - std, 2)
-    upper = round(pred_inv + std, 2)
+# LSTMModel weights as the arrays of lstm_numpy.NumpyLSTM
 
-    # Return a list of today's price, predicted price, change percentage, and prediction interval bounds
-    return [today_price, pred_inv, change, lower, upper]
+
+def numpy_weights(model):
+    state = {name: tensor.numpy() for name, tensor in model.state_dict().items()}
+    return {
+        "weight_ih": state["lstm.weight_ih_l0"].T,
+        "weight_hh": state["lstm.weight_hh_l0"].T,
+        "bias": state["lstm.bias_ih_l0"] + state["lstm.bias_hh_l0"],
+        "fc_weight": state["fc.weight"].T,
+        "fc_bias": state["fc.bias"],
+    }
+
+# Export the current artifacts to the .npz used by the torch-free backend (lstm_numpy) and return
+# the maximum price difference with the float model. Run again whenever the artifacts are replaced.
+
+
+def export_numpy(npz_path=NPZ_PATH):
+    registry = _registry.refresh()
+    scaler = registry.scaler
+
+    np.savez_compressed(
+        npz_path,
+        **numpy_weights(registry.model),
+        scale=scaler.scale_,
+        min=scaler.min_,
+        feature_names=np.asarray(scaler.feature_names_in_, dtype=str),
+        std=np.float64(registry.std),
+        source_version=np.asarray(registry.version))
+
+    # The exported model must reproduce the float model
+    model, _, _ = load_npz(npz_path)
+    return check_drift("numpy", model, registry.model, scaler)
+
+# Execution engine of a model: a function from scaled (N, WINDOW_SIZE, features) float32 windows to
+# the N scaled predictions
+
+
+def _torch_engine(module):
+    def run(windows_scaled):
+        with torch.inference_mode():
+            return module(torch.from_numpy(windows_scaled)).numpy()[:, 0]
+
+    return run
+
+
+def _onnx_engine(model):
+    try:
+        import onnxruntime
+    except ImportError as error:
+        raise ImportError(
+            "The 'onnx' LSTM engine needs onnxruntime (pip install onnxruntime)") from error
+
+    buffer = io.BytesIO()
+    example = torch.zeros(1, WINDOW_SIZE, model.lstm.input_size)
+    torch.onnx.export(model, (example,), buffer, input_names=["windows"], output_names=["price"],
+                      dynamic_axes={"windows": {0: "batch"}, "price": {0: "batch"}}, dynamo=False)
+    session = onnxruntime.InferenceSession(
+        buffer.getvalue(), providers=["CPUExecutionProvider"])
+
+    def run(windows_scaled):
+        return session.run(None, {"windows": windows_scaled})[0][:, 0]
+
+    return run
+
+
+def build_engine(name, model):
+    if name == "float":
+        return _torch_engine(model)
+
+    if name == "torchscript":
+        example = torch.zeros(1, WINDOW_SIZE, model.lstm.input_size)
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(model, example))
+        return _torch_engine(traced)
+
+    if name == "int8":
+        # Dynamic quantization: int8 weights, activations quantized on the fly
+        quantized = torch.ao.quantization.quantize_dynamic(
+            model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+        return _torch_engine(quantized)
+
+    if name == "onnx":
+        return _onnx_engine(model)
+
+    if name == "numpy":
+        return NumpyLSTM(**numpy_weights(model))
+
+    raise ValueError(
+        f"Unknown LSTM engine '{name}', expected one of {', '.join(ENGINES)}")
+
+# Maximum predicted price difference between an engine and the float model, over windows sampled
+# uniformly in the scaler's data range (the scaled [0, 1] box). Raises a ValueError above the
+# engine's tolerance
+
+
+def check_drift(name, engine, model, scaler, n_windows=1024, seed=0):
+    target_index = list(scaler.feature_names_in_).index(TARGET_COLUMN)
+    windows_scaled = np.random.default_rng(seed).random(
+        (n_windows, WINDOW_SIZE, len(scaler.scale_)), dtype=np.float32)
+
+    expected = unscale_target(scaler, _torch_engine(model)(windows_scaled), target_index)
+    predicted = unscale_target(scaler, engine(windows_scaled), target_index)
+
+    drift = float(np.abs(predicted - expected).max())
+    if drift > ENGINE_TOLERANCE[name]:
+        raise ValueError(
+            f"LSTM engine '{name}' drifts from the float model by {drift:.4f} SAR")
+
+    return drift
+
+
+_engine_cache = {}
+
+# Return the named engine of a model (the current LSTM by default), built and drift checked once
+
+
+def get_engine(name=None, model=None, scaler=None):
+    name = name or LSTM_ENGINE
+    if model is None:
+        model, scaler = load_LSTM()
+
+    cached = _engine_cache.get(name)
+    if cached is not None and cached[0] is model:
+        return cached[1]
+
+    engine = build_engine(name, model)
+    if name != "float":
+        check_drift(name, engine, model, scaler if scaler is not None else load_LSTM()[1])
+
+    _engine_cache[name] = (model, engine)
+    return engine
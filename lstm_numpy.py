@@ -0,0 +1,222 @@
+import hashlib
+import os
+import threading
+import numpy as np
+
+# Torch-free LSTM inference: the LSTMModel weights, scaler parameters and testing std are exported
+# once to a compact .npz (see lstm_model.export_numpy) and the gates run in vectorized NumPy.
+# Only NumPy is imported, so API workers can predict without loading torch or scikit-learn.
+
+# Number of past trading days the LSTM looks at
+WINDOW_SIZE = 10
+
+# Column predicted by the LSTM
+TARGET_COLUMN = 'Close'
+
+# LSTM artifacts: model weights, fitted scaler and testing standard deviation
+WEIGHTS_PATH = "lstm_model_weights.pth"
+SCALER_PATH = "lstm_scaler.pkl"
+STD_PATH = "lstm_std.csv"
+
+# Exported LSTM artifacts, tied to the hash of the artifacts above
+NPZ_PATH = "lstm_model_weights.npz"
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of the LSTM artifacts (model, scaler and std) built by 'loader' from 'paths'.
+
+    The artifacts are versioned by the hash of their files. The cheap mtime/size
+    stamp is checked on every access and the files are only hashed when it moves,
+    so replacing the artifacts on disk hot-reloads them without a restart.
+    """
+
+    def __init__(self, loader, paths):
+        self.loader = loader
+        self.paths = paths
+        self.model = None
+        self.scaler = None
+        self.std = None
+        self.version = None
+        self.stamp = None
+        self.loads = 0
+        self.lock = threading.Lock()
+
+    def _file_stamp(self):
+        return tuple((stat.st_mtime_ns, stat.st_size) for stat in map(os.stat, self.paths))
+
+    def _file_hash(self):
+        return file_hash(self.paths)
+
+    # Load the artifacts once, and again only if their content changed
+
+    def refresh(self):
+        stamp = self._file_stamp()
+        if stamp == self.stamp:
+            return self
+
+        with self.lock:
+            if stamp != self.stamp:
+                version = self._file_hash()
+                if version != self.version:
+                    self.model, self.scaler, self.std = self.loader(
+                        *self.paths)
+                    self.version = version
+                    self.loads += 1
+                self.stamp = stamp
+
+        return self
+
+
+# Hash of the content of files, the version of the artifacts they hold
+
+
+def file_hash(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class MinMaxParams:
+    """Fitted MinMax scaler parameters, with the attributes of sklearn's MinMaxScaler used for inference."""
+
+    def __init__(self, scale, min_, feature_names):
+        self.scale_ = scale
+        self.min_ = min_
+        self.feature_names_in_ = feature_names
+
+
+class NumpyLSTM:
+    """
+    Single layer LSTM followed by a Linear layer, equivalent to LSTMModel in eval mode.
+
+    The input projection of every timestep is computed in one matrix product, so
+    only the recurrent product remains in the loop over the window.
+    """
+
+    def __init__(self, weight_ih, weight_hh, bias, fc_weight, fc_bias):
+        # Transposed for row-major (batch, features) products, gates in torch order (i, f, g, o)
+        self.weight_ih = weight_ih
+        self.weight_hh = weight_hh
+        self.bias = bias
+        self.fc_weight = fc_weight
+        self.fc_bias = fc_bias
+        self.hidden_size = weight_hh.shape[0]
+
+    # Predict the scaled target of a (N, timesteps, features) batch, returns shape (N,)
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=self.weight_ih.dtype)
+        n, steps, _ = x.shape
+        hidden = self.hidden_size
+
+        gates_x = x @ self.weight_ih + self.bias
+        h = np.zeros((n, hidden), dtype=x.dtype)
+        c = np.zeros((n, hidden), dtype=x.dtype)
+
+        for t in range(steps):
+            gates = gates_x[:, t] + h @ self.weight_hh
+            i = _sigmoid(gates[:, :hidden])
+            f = _sigmoid(gates[:, hidden:2 * hidden])
+            g = np.tanh(gates[:, 2 * hidden:3 * hidden])
+            o = _sigmoid(gates[:, 3 * hidden:])
+            c = f * c + i * g
+            h = o * np.tanh(c)
+
+        return (h @ self.fc_weight + self.fc_bias)[:, 0]
+
+
+def _sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1)
+
+# Build the model, scaler and std from an exported .npz. Raises a ValueError if the export does not
+# match the source artifacts (when they are deployed next to it)
+
+
+def load_npz(npz_path, source_paths=(WEIGHTS_PATH, SCALER_PATH, STD_PATH)):
+    with np.load(npz_path) as arrays:
+        if all(map(os.path.exists, source_paths)):
+            exported = str(arrays["source_version"]) if "source_version" in arrays else None
+            if exported != file_hash(source_paths):
+                raise ValueError(
+                    f"{npz_path} was not exported from the current LSTM artifacts, "
+                    "re-export it with lstm_model.export_numpy()")
+
+        model = NumpyLSTM(arrays["weight_ih"], arrays["weight_hh"], arrays["bias"],
+                          arrays["fc_weight"], arrays["fc_bias"])
+        scaler = MinMaxParams(arrays["scale"], arrays["min"],
+                              arrays["feature_names"].astype(str))
+        std = float(arrays["std"])
+
+    return model, scaler, std
+
+
+_registry = ModelRegistry(load_npz, (NPZ_PATH,))
+
+# Load the NumPy model and scaler (cached, reloaded only when the .npz changes)
+
+
+def load_numpy_LSTM():
+    registry = _registry.refresh()
+    return [registry.model, registry.scaler]
+
+# Scale windows of raw bars with the fitted MinMax scaler in one vectorized pass (any leading shape)
+
+
+def scale_windows(scaler, windows):
+    return windows * scaler.scale_ + scaler.min_
+
+# Undo the scaling of the target column only
+
+
+def unscale_target(scaler, values, target_index):
+    return (values - scaler.min_[target_index]) / scaler.scale_[target_index]
+
+# Stack the windows (DataFrames latest day first, or a (N, WINDOW_SIZE, features) array in the same
+# order) and scale them oldest day first, as the model expects.
+# Returns the raw windows, the scaled windows and the target column index
+
+
+def prepare_windows(scaler, windows):
+    features = list(scaler.feature_names_in_)
+    target_index = features.index(TARGET_COLUMN)
+
+    if isinstance(windows, np.ndarray):
+        windows = windows.astype(np.float64, copy=False)
+    else:
+        windows = np.stack([window[features].to_numpy(dtype=np.float64)
+                           for window in windows])
+
+    # Reorder the windows to start from the oldest date, then scale all of them at once
+    windows_scaled = scale_windows(scaler, windows[:, ::-1, :])
+
+    return windows, windows_scaled, target_index
+
+# Turn the scaled model outputs into arrays of today's price, predicted price, change percentage
+# and prediction interval bounds
+
+
+def finish_predictions(scaler, windows, price_pred, target_index, std):
+    # Inverse transform the predicted values
+    pred_inv = np.round(unscale_target(scaler, price_pred, target_index), 2)
+
+    # Last known day stock price of each window
+    today_price = windows[:, 0, target_index]
+    change = np.round(((pred_inv - today_price) / today_price) * 100, 2)
+
+    # Compute prediction intervals
+    lower = np.round(pred_inv - std, 2)
+    upper = np.round(pred_inv + std, 2)
+
+    return [today_price, pred_inv, change, lower, upper]
+
+# NumPy version of lstm_model.predict_batch
+
+
+def predict_batch_numpy(model, scaler, windows):
+    windows, windows_scaled, target_index = prepare_windows(scaler, windows)
+    price_pred = model(windows_scaled)
+
+    return finish_predictions(scaler, windows, price_pred, target_index, _registry.refresh().std)
@@ -1,13 +1,12 @@
 # main.py (FastAPI application)
-import pandas as pd
 from datetime import datetime, timedelta, date
 import time
 from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Dict, Any
-from tasi_api import fetch_data
-from lstm_model import load_LSTM, predict_price
+from tasi_api import fetch_data_async, fetch_latest_async
+from lstm_model import WINDOW_SIZE, load_LSTM, predict_price
 from sentiment_analysis import load_sentiment, analyze_sentiment
 import gemini_models as gem
 import memory_functions as mem
@@ -39,13 +38,8 @@ async def apply_framework(models, end_date, company_name='Aramco'):
 
     reference_date = datetime.strptime(end_date, "%d-%m-%Y")
 
-    # Subtract 30 days
-    start_date = reference_date - timedelta(days=30)
-    # Convert back to string
-    start_date = start_date.strftime("%d-%m-%Y")
-
-    # Fetch data
-    data = fetch_data(start_date, end_date)
+    # Fetch the latest LSTM window + the actual day only
+    data = await fetch_latest_async(end_date, WINDOW_SIZE + 1)
 
     # for testing
     actual_price = data[:1].copy()
@@ -82,7 +76,7 @@ async def apply_framework(models, end_date, company_name='Aramco'):
 
     # Memory bank analysis
     memory_results, scenarios_found, success_rate = mem.query_memory(
-        pred_price, change, sentiment_score)
+        pred_price, change, sentiment_score, company_name=company_name)
 
     # Analyze using all data collectively
     report = gem.analyze_all(client, company_name, pred_price,
@@ -122,14 +116,12 @@ async def apply_framework(models, end_date, company_name='Aramco'):
 # Helper function during testing retrieve last computed date and restart after it
 
 
-def remove_done(batch):
-    memory = pd.read_excel('investment_memory.xlsx', engine='openpyxl')
+def remove_done(batch, company_name='Aramco'):
+    last = mem.last_computed_date(company_name)
 
-    if memory.empty:
+    if last is None:
         return batch
 
-    last = memory.iloc[-1]["Datetime"]
-
     if last in batch:
         i = batch.index(last)
         batch = batch[i+1:]
@@ -138,10 +130,10 @@ def remove_done(batch):
     return batch
 
 
-def decision_computed(today_date):
-    memory = pd.read_excel('investment_memory.xlsx', engine='openpyxl')
+def decision_computed(today_date, company_name='Aramco'):
+    last = mem.last_computed_date(company_name)
 
-    if memory.empty or today_date != memory.iloc[-1]["Datetime"]:
+    if last is None or today_date != last:
         return False
     else:
         return True
@@ -210,39 +202,41 @@ async def dashboard_data():
     counter1 = 0
     counter2 = 0
 
-    for end_date in backtest_dates:
+    # Buffer memory writes and flush them every 10 days (and on failure, so remove_done can resume)
+    with mem.batch_writes(flush_every=10):
+        for end_date in backtest_dates:
 
-        # Skip weekends
-        if today_is_a_weekend(end_date):
-            print(f"\nTodays date: {end_date} is a weekend. Skipping..", end="\n\n")
-            continue
+            # Skip weekends
+            if today_is_a_weekend(end_date):
+                print(f"\nTodays date: {end_date} is a weekend. Skipping..", end="\n\n")
+                continue
 
-        # To mimic human behavior
-        if counter1 >= 30:
-            counter1 = 0
-            print("\nTaking a break for a few minutes (5 min)..")
-            time.sleep(300)
-            print("Resuming execution now.", end="\n\n")
+            # To mimic human behavior
+            if counter1 >= 30:
+                counter1 = 0
+                print("\nTaking a break for a few minutes (5 min)..")
+                time.sleep(300)
+                print("Resuming execution now.", end="\n\n")
 
-        # To mimic human behavior
-        if counter2 >= 60:
-            counter2 = 0
-            print("\nTaking a break for a few minutes (10 min)..")
-            time.sleep(600)
-            print("Resuming execution now.", end="\n\n")
+            # To mimic human behavior
+            if counter2 >= 60:
+                counter2 = 0
+                print("\nTaking a break for a few minutes (10 min)..")
+                time.sleep(600)
+                print("Resuming execution now.", end="\n\n")
 
-        # Run the framework and fetch all needed data for the dashboard
-        results = await apply_framework(models_list, end_date)
+            # Run the framework and fetch all needed data for the dashboard
+            results = await apply_framework(models_list, end_date)
 
-        lstm_list.append(results['lstm_pred'])
-        sentiment_list.append(results['sentiment_score'])
+            lstm_list.append(results['lstm_pred'])
+            sentiment_list.append(results['sentiment_score'])
 
-        if end_date != "14-09-2025":
-            mem.update_memory_daily(
-                results['actual_price'], results['ground_percentage'])
+            if end_date != "14-09-2025":
+                mem.update_memory_daily(
+                    results['actual_price'], results['ground_percentage'])
 
-        counter1 = counter1 + 1
-        counter2 = counter2 + 1
+            counter1 = counter1 + 1
+            counter2 = counter2 + 1
 
     """
     # Daily Inference Settings
@@ -280,8 +274,8 @@ async def dashboard_data():
         yesterday_date = mem.last_computed_date()
 
         # fetch last actual closing price (yesterday) and its change percentage
-        yesterday_data = fetch_data(
-            yesterday_date, yesterday_date, max_records=1)
+        yesterday_data = await fetch_data_async(
+            yesterday_date, yesterday_date, max_records=1, window_size=1)
         yesterday_price = yesterday_data['Close'].iloc[0]
         ground_percentage = yesterday_data['changePercent'].iloc[0]
 
@@ -300,6 +294,8 @@ async def dashboard_data():
         # Retrieve the last week LSTM and Sentiment results for display
         lstm_list, sentiment_list = mem.fetch_lists()
 
+        print(f"Memory cache stats: {mem.cache_stats()}")
+
         # ------------------------------------------------------------------
         # Simulate dynamic data changes for demonstration
         confidence = results['confidence']
@@ -336,6 +332,7 @@ async def dashboard_data():
         #
         memory_success_rate = results['success_rate']
         memory_scenarios_found = results['scenarios_found']
+        memory_accuracy = mem.accuracy_stats()
         # Check if the model was able to draw several key insights
         memory_insight = "No significant insights found."
         for kp in results.get('key_points', []):
@@ -389,6 +386,7 @@ async def dashboard_data():
             "memory_bank": {
                 "scenarios_found": memory_scenarios_found,
                 "success_rate": memory_success_rate,
+                "accuracy": memory_accuracy,
                 "insight": memory_insight
             },
             "weekend": False
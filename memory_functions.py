@@ -1,36 +1,507 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
 import pandas as pd
+from memory_index import SimilarityIndex
+import numpy as np
+from memory_stats import AccuracyStats, ACCEPTED_THRESHOLD, score_decisions, sweep_thresholds
+
+# The memory bank is stored in an SQLite database (append-only table indexed by date)
+MEMORY_DB = 'investment_memory.db'
+
+# Legacy Excel memory, migrated once into the database on first use
+LEGACY_MEMORY_XLSX = 'investment_memory.xlsx'
+
+# Columns exposed to the rest of the framework (same layout as the legacy workbook)
+MEMORY_COLUMNS = [
+    'Datetime',
+    'Company',
+    'Predicted_Price',
+    'Predicted_Change_Percentage',
+    'Sentiment_Score',
+    'News',
+    'Analysis',
+    'Decision',
+    'Actual_Price',
+    'Ground_Truth_Change_Percentage',
+    'Ground_Truth_Decision'
+]
+
+# Ground truth columns are NULL until the next trading day updates them
+GROUND_TRUTH_COLUMNS = ['Actual_Price',
+                        'Ground_Truth_Change_Percentage', 'Ground_Truth_Decision']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Datetime TEXT NOT NULL,
+    Date TEXT NOT NULL,
+    Company TEXT NOT NULL,
+    Predicted_Price REAL,
+    Predicted_Change_Percentage REAL,
+    Sentiment_Score REAL,
+    News TEXT,
+    Analysis TEXT,
+    Decision TEXT,
+    Actual_Price REAL,
+    Ground_Truth_Change_Percentage REAL,
+    Ground_Truth_Decision INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_memory_date ON memory (Date);
+CREATE INDEX IF NOT EXISTS idx_memory_company_date ON memory (Company, Date);
+"""
+
+# Features used to retrieve similar past scenarios
+SIMILARITY_COLUMNS = ['Predicted_Price',
+                      'Predicted_Change_Percentage', 'Sentiment_Score']
 
-# Create the query function to retrieve last 30 entries and entries with similar characteristics
+# Convert the 'DD-MM-YYYY' dates used across the framework to sortable ISO dates
 
 
-def query_memory(next_pred, change, sentiment_score):
-    memory_df = pd.read_excel('investment_memory.xlsx', engine='openpyxl')
+def to_iso_date(date_str):
+    return datetime.strptime(date_str, "%d-%m-%Y").strftime("%Y-%m-%d")
 
-    # Convert 'Datetime' to datetime type
-    memory_df['Datetime'] = pd.to_datetime(memory_df['Datetime'])
+# Replace the legacy '-' placeholders with NULL
+
+
+def _clean_value(value):
+    if value is None or (isinstance(value, str) and value.strip() == '-'):
+        return None
+    if isinstance(value, float) and pd.isna(value):
+        return None
+    return value
+
+# One-shot migration of the legacy Excel memory into the database
+
+
+def migrate_from_excel(conn, xlsx_path=LEGACY_MEMORY_XLSX):
+    legacy_df = pd.read_excel(xlsx_path, engine='openpyxl')
+
+    rows = []
+    for entry in legacy_df.to_dict(orient='records'):
+        row = [_clean_value(entry.get(col)) for col in MEMORY_COLUMNS]
+        # Add the ISO date used by the date index
+        row.insert(1, to_iso_date(str(entry['Datetime'])))
+        rows.append(row)
+
+    conn.executemany(
+        f"INSERT INTO memory (Datetime, Date, {', '.join(MEMORY_COLUMNS[1:])}) "
+        f"VALUES ({', '.join(['?'] * (len(MEMORY_COLUMNS) + 1))})", rows)
+
+    print(f"Migrated {len(rows)} entries from {xlsx_path} to {MEMORY_DB}.")
+
+# Create the memory database, migrating the legacy Excel memory if any. The database is built in a
+# temporary file and moved into place only once complete, so a failed migration leaves nothing behind
+
+
+def create_memory_db():
+    tmp_path = MEMORY_DB + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        with conn:
+            conn.executescript(SCHEMA)
+            if os.path.exists(LEGACY_MEMORY_XLSX):
+                migrate_from_excel(conn)
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+
+    conn.close()
+    os.replace(tmp_path, MEMORY_DB)
+
+# Open the memory database, creating (and migrating) it on first use
+
+
+@contextmanager
+def open_memory():
+    if not os.path.exists(MEMORY_DB):
+        create_memory_db()
+
+    conn = sqlite3.connect(MEMORY_DB)
+    try:
+        with conn:
+            conn.executescript(SCHEMA)
+
+        # Commit on success, rollback on failure
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+# Insert one entry (optionally with an explicit id) and return its id
+
+
+def _insert_entry(conn, entry, entry_id=None):
+    if entry_id is not None:
+        entry = {'id': entry_id, **entry}
+
+    cursor = conn.execute(
+        f"INSERT INTO memory ({', '.join(entry)}) "
+        f"VALUES ({', '.join(['?'] * len(entry))})", list(entry.values()))
+
+    return cursor.lastrowid
+
+# Update the given columns of one entry in place
+
+
+def _update_entry(conn, entry_id, values):
+    conn.execute(
+        f"UPDATE memory SET {', '.join(f'{col} = ?' for col in values)} WHERE id = ?",
+        list(values.values()) + [int(entry_id)])
+
+# Pending writes accumulated while batch_writes() is active
+
+
+class WriteBatch:
+    """
+    Write-behind buffer for memory writes (used during backtests).
+
+    New entries get their final ids up front, so the cache and the similarity
+    index can serve them before they reach the database. Pending writes are
+    committed in a single transaction, so a crash never leaves a half-written day.
+    """
+
+    def __init__(self, next_id, flush_every):
+        self.next_id = next_id
+        self.flush_every = flush_every
+        self.inserts = {}
+        self.updates = {}
+        self.days = 0
+
+    def add_insert(self, entry):
+        entry_id = self.next_id
+        self.next_id += 1
+        self.inserts[entry_id] = entry
+        self.days += 1
+        return entry_id
+
+    def add_update(self, entry_id, values):
+        if entry_id in self.inserts:
+            self.inserts[entry_id].update(values)
+        else:
+            self.updates.setdefault(entry_id, {}).update(values)
+
+    def is_due(self):
+        return self.days >= self.flush_every
+
+    def is_empty(self):
+        return not self.inserts and not self.updates
+
+    # Write all pending entries and updates in one transaction
+
+    def commit(self, conn):
+        for entry_id, entry in self.inserts.items():
+            _insert_entry(conn, entry, entry_id)
+        for entry_id, values in self.updates.items():
+            _update_entry(conn, entry_id, values)
+
+    def clear(self):
+        self.inserts = {}
+        self.updates = {}
+        self.days = 0
+
+# Process-wide cache of the parsed memory table
+
+
+class MemoryCache:
+    """
+    Holds the memory table as typed DataFrames (indexed by entry id), one partition per company.
+
+    Each company partition is loaded on first use with its own similarity index,
+    so queries for one ticker never scan another ticker's history. The cache is
+    stamped with the database file's mtime and size, so edits made outside this
+    process trigger a reload. Writes go through to both the database and the
+    cached partition.
+    """
+
+    def __init__(self):
+        self.partitions = {}
+        self.similarity_indexes = {}
+        self.accuracy_stats = {}
+        self.stamp = None
+        self.hits = 0
+        self.misses = 0
+
+        # Active write-behind batch (None when writing through)
+        self.batch = None
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(MEMORY_DB)
+        except FileNotFoundError:
+            return None
+
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def is_fresh(self):
+        return self.stamp is not None and self.stamp == self._file_stamp()
+
+    # Return the cached partition of a company, reloading it if the database changed
+
+    def load(self, company_name):
+        if not self.is_fresh():
+            self.invalidate()
+
+        if company_name in self.partitions:
+            self.hits += 1
+            return self.partitions[company_name]
+
+        self.misses += 1
+        with open_memory() as conn:
+            frame = pd.read_sql_query(
+                f"SELECT id, Date, {', '.join(MEMORY_COLUMNS)} FROM memory WHERE Company = ? ORDER BY id",
+                conn, params=(company_name,), index_col='id')
+
+        # Ensure typed numeric columns (pending ground truth is NaN)
+        for col in SIMILARITY_COLUMNS + GROUND_TRUTH_COLUMNS:
+            frame[col] = pd.to_numeric(frame[col], errors='coerce')
+
+        self.partitions[company_name] = frame
+        self.stamp = self._file_stamp()
+
+        # Re-apply writes that are still waiting in the write-behind batch
+        if self.batch is not None:
+            for entry_id, entry in self.batch.inserts.items():
+                if entry['Company'] == company_name:
+                    self.append(entry_id, entry)
+            for entry_id, values in self.batch.updates.items():
+                if entry_id in frame.index:
+                    self.update(entry_id, company_name, values)
+
+        return self.partitions[company_name]
+
+    # Nearest-neighbour index over a company partition, built on first use
+
+    def get_similarity_index(self, company_name):
+        if company_name not in self.similarity_indexes:
+            frame = self.load(company_name)
+            self.similarity_indexes[company_name] = SimilarityIndex.build(
+                zip(frame.index, frame[SIMILARITY_COLUMNS].itertuples(index=False)))
+
+        return self.similarity_indexes[company_name]
+
+    # Running accuracy statistics of a company partition, built on first use
+
+    def get_accuracy_stats(self, company_name):
+        if company_name not in self.accuracy_stats:
+            frame = self.load(company_name)
+            labelled = frame[frame['Ground_Truth_Decision'].notna()]
+            self.accuracy_stats[company_name] = AccuracyStats.build(
+                labelled[['Date', 'Decision', 'Sentiment_Score', 'Ground_Truth_Decision']].itertuples(index=False))
+
+        return self.accuracy_stats[company_name]
+
+    # Write-through helpers, called after the database write was committed (or buffered)
+
+    def append(self, entry_id, entry):
+        company_name = entry['Company']
+        if company_name in self.partitions:
+            self.partitions[company_name].loc[entry_id] = pd.Series(entry)
+        if company_name in self.similarity_indexes:
+            self.similarity_indexes[company_name].insert(
+                entry_id, [entry[col] for col in SIMILARITY_COLUMNS])
+        self.stamp = self._file_stamp()
+
+    def update(self, entry_id, company_name, values):
+        if company_name in self.partitions:
+            frame = self.partitions[company_name]
+            for col, value in values.items():
+                frame.at[entry_id, col] = value
+
+            # Count the new ground truth label in the running statistics
+            if company_name in self.accuracy_stats and 'Ground_Truth_Decision' in values:
+                self.accuracy_stats[company_name].add(
+                    frame.at[entry_id, 'Date'], frame.at[entry_id, 'Decision'],
+                    frame.at[entry_id, 'Sentiment_Score'], values['Ground_Truth_Decision'])
+        self.stamp = self._file_stamp()
+
+    def invalidate(self):
+        self.partitions = {}
+        self.similarity_indexes = {}
+        self.accuracy_stats = {}
+        self.stamp = None
+
+
+_cache = MemoryCache()
+
+# Write all pending batched entries to the database
+
+
+def flush_memory():
+    batch = _cache.batch
+    if batch is None or batch.is_empty():
+        return
+
+    cache_fresh = _cache.is_fresh()
+
+    with open_memory() as conn:
+        batch.commit(conn)
+
+    print(
+        f"Flushed {len(batch.inserts)} new and {len(batch.updates)} updated entries to memory.")
+    batch.clear()
+
+    # The cache already holds the flushed rows, only the file stamp changed
+    if cache_fresh:
+        _cache.stamp = _cache._file_stamp()
+    else:
+        _cache.invalidate()
+
+# Buffer memory writes and flush them every 'flush_every' days, at the end, or on failure
+
+
+@contextmanager
+def batch_writes(flush_every=10):
+    if _cache.batch is not None:
+        # Already batching, join the outer batch
+        yield
+        return
+
+    with open_memory() as conn:
+        last_id = conn.execute(
+            "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'memory'), 0), "
+            "COALESCE((SELECT MAX(id) FROM memory), 0))").fetchone()[0]
+
+    _cache.batch = WriteBatch(last_id + 1, flush_every)
+    try:
+        yield
+    finally:
+        # Flush whatever was computed so far, even when the backtest crashed
+        try:
+            flush_memory()
+        finally:
+            _cache.batch = None
+
+# Report the memory cache hit/miss counters
+
+
+def cache_stats():
+    return {
+        "hits": _cache.hits,
+        "misses": _cache.misses,
+        "rows": {company: len(frame) for company, frame in _cache.partitions.items()}
+    }
+
+# Default token budget of the memory context inlined into the analysis prompt
+MEMORY_TOKEN_BUDGET = 2000
+
+# Number of most similar entries that keep (truncated) news and analysis text
+MEMORY_TEXT_ROWS = 3
+
+# Rough token estimate (about 4 characters per token for Gemini models)
+
+
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+# Format one memory value for the compact table ('-' when missing)
+
+
+def _format_value(value, digits=2):
+    if value is None or pd.isna(value):
+        return '-'
+    if isinstance(value, float):
+        value = f"{value:.{digits}f}"
+        return value.rstrip('0').rstrip('.') if '.' in value else value
+    return str(value)
+
+# Encode retrieved memory entries as a compact, token-budgeted context for the LLM prompt
+
+
+def encode_memory_context(entries, similar_ids, token_budget=MEMORY_TOKEN_BUDGET, text_rows=MEMORY_TEXT_ROWS):
+    """
+    Numeric columns are emitted as a dense pipe-separated table, most similar
+    and most recent entries first until the budget is used. Truncated news and
+    analysis text is only added for the few most similar entries.
+
+    Returns the context string and its estimated token count.
+    """
+    header = (
+        "Past memory entries (newest first), one per line:\n"
+        "date|decision|predicted_price|predicted_change_%|sentiment|actual_price|actual_change_%|correct(1/0)\n"
+    )
+    used = estimate_tokens(header)
+
+    # Rank rows: similar entries by distance first, then the remaining recent entries by date
+    recent_ids = [entry_id for entry_id in entries.index[::-1]
+                  if entry_id not in similar_ids]
+    ranked_ids = list(similar_ids) + recent_ids
+
+    lines = {}
+    for entry_id in ranked_ids:
+        entry = entries.loc[entry_id]
+        line = "|".join([
+            entry['Datetime'],
+            _format_value(entry['Decision']),
+            _format_value(entry['Predicted_Price']),
+            _format_value(entry['Predicted_Change_Percentage']),
+            _format_value(entry['Sentiment_Score'], 3),
+            _format_value(entry['Actual_Price']),
+            _format_value(entry['Ground_Truth_Change_Percentage']),
+            _format_value(entry['Ground_Truth_Decision'], 0)
+        ]) + "\n"
+
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            break
+        lines[entry_id] = line
+        used += cost
+
+    # Keep the table in chronological order (newest first)
+    context = header + "".join(lines[entry_id] for entry_id in sorted(
+        lines, key=lambda entry_id: entries.at[entry_id, 'Date'], reverse=True))
+
+    # Add truncated text for the most similar entries with the remaining budget
+    notes = [entry_id for entry_id in similar_ids if entry_id in lines][:text_rows]
+    if notes:
+        notes_header = "\nNotes on the most similar past days:\n"
+        if used + estimate_tokens(notes_header) < token_budget:
+            context += notes_header
+            used += estimate_tokens(notes_header)
+
+            for i, entry_id in enumerate(notes):
+                # Share the remaining budget between the remaining notes (in characters)
+                chars = (token_budget - used) * 4 // (len(notes) - i)
+                entry = entries.loc[entry_id]
+                note = f"[{entry['Datetime']}] Analysis: {_format_value(entry['Analysis'])} News: {_format_value(entry['News'])}"
+                note = " ".join(note.split())
+                if len(note) > chars - 1:
+                    note = note[:max(chars - 4, 0)].rstrip() + "..."
+                if chars < 40:
+                    break
+
+                context += note + "\n"
+                used += estimate_tokens(note + "\n")
+
+    return context, estimate_tokens(context)
+
+# Create the query function to retrieve last 30 entries and the k most similar entries
+
+
+def query_memory(next_pred, change, sentiment_score, k=30, company_name="Aramco", token_budget=MEMORY_TOKEN_BUDGET):
+    memory_df = _cache.load(company_name)
 
     # Filter for the last 30 entries
     recent_entries = memory_df.tail(30)
 
-    # Filter for entries with similar characteristics
-    similar_entries = memory_df[
-        (memory_df['Predicted_Price'].between(next_pred * 0.90, next_pred * 1.1)) &
-        (memory_df['Predicted_Change_Percentage'].between(change * 0.90, change * 1.1)) &
-        (memory_df['Sentiment_Score'].between(
-            sentiment_score * 0.90, sentiment_score * 1.1))
-    ]
+    # Retrieve the k nearest past scenarios (normalized distance over the similarity features)
+    neighbours = _cache.get_similarity_index(company_name).query(
+        (next_pred, change, sentiment_score), k)
+    similar_ids = [entry_id for _, entry_id in neighbours]
+    similar_entries = memory_df.loc[similar_ids]
 
     # If the memory is empty, return a message
     if recent_entries.empty and similar_entries.empty:
-        return "No recent or similar entries found in memory."
-
-    # Limit similar entries to 30 if there are too many
-    if len(similar_entries) > 30:
-        similar_entries = similar_entries.head(30)
+        return "No recent or similar entries found in memory.", 0, 0
 
     # Combine recent and similar entries
-    combined_entries = pd.concat(
-        [recent_entries, similar_entries]).drop_duplicates().reset_index(drop=True)
+    combined_entries = pd.concat([recent_entries, similar_entries])
+    combined_entries = combined_entries[~combined_entries.index.duplicated()]
 
     # Get the total number of recent and similar entries found
     size = len(combined_entries)
@@ -39,121 +510,160 @@ def query_memory(next_pred, change, sentiment_score):
     success = ((combined_entries['Ground_Truth_Decision']
                == 1).sum() / size)*100 if size > 0 else 0
 
-    # Ensure the combined DataFrame is sorted by Datetime
-    combined_entries.sort_values(by='Datetime', ascending=False, inplace=True)
-
-    # Convert Dataframe to JSON string for prompt
-    combined_entries_json = combined_entries.to_json(
-        orient='records', force_ascii=False)
+    # Encode the entries as a compact context for the prompt
+    memory_context, tokens = encode_memory_context(
+        combined_entries, similar_ids, token_budget)
+    print(f"Memory context: {size} entries in ~{tokens} tokens.")
 
-    # Return the combined DataFrame and the number of recent and similar entries found
-    return combined_entries_json, size, success
+    # Return the memory context and the number of recent and similar entries found
+    return memory_context, size, success
 
 # Function to add a new entry to the memory
 
 
 def insert_memory(end_date, next_pred, change, sentiment_score, news, decision, analysis, company_name="Aramco"):
-    # Load the existing memory DataFrame
-    memory_df = pd.read_excel('investment_memory.xlsx', engine='openpyxl')
-
-    # Create a new entry
+    # Create a new entry (ground truth columns are updated later)
     new_entry = {
         'Datetime': end_date,
+        'Date': to_iso_date(end_date),
         'Company': company_name,
         'Predicted_Price': next_pred,
         'Predicted_Change_Percentage': change,
         'Sentiment_Score': sentiment_score,
         'News': news,
         'Analysis': analysis,
-        'Decision': decision,
-        'Actual_Price': '-',  # To be updated later
-        'Ground_Truth_Change_Percentage': '-',  # To be updated later
-        'Ground_Truth_Decision': '-'  # To be updated later
+        'Decision': decision
     }
 
-    # Append the new entry to the DataFrame
-    memory_df = pd.concat(
-        [memory_df, pd.DataFrame([new_entry])], ignore_index=True)
+    # In batch mode, buffer the entry and flush every few days
+    if _cache.batch is not None:
+        _cache.load(company_name)
+        _cache.append(_cache.batch.add_insert(new_entry), new_entry)
+        print("New entry added to memory (pending flush).")
+
+        if _cache.batch.is_due():
+            flush_memory()
+        return
+
+    # Only patch the cache if it reflects the database right before this write
+    cache_fresh = _cache.is_fresh()
+
+    # Append the new entry to the memory table
+    with open_memory() as conn:
+        entry_id = _insert_entry(conn, new_entry)
+
+    if cache_fresh:
+        _cache.append(entry_id, new_entry)
+    else:
+        _cache.invalidate()
 
-    # Save the updated DataFrame back to the Excel file
-    memory_df.to_excel('investment_memory.xlsx',
-                       index=False, engine='openpyxl')
     print("New entry added to memory.")
 
 
-def update_memory_daily(actual_price, ground_percentage):
-    # Load the existing memory DataFrame
-    memory_df = pd.read_excel('investment_memory.xlsx', engine='openpyxl')
+def update_memory_daily(actual_price, ground_percentage, company_name="Aramco"):
+    memory_df = _cache.load(company_name)
 
     # if the memory is not empty
-    if not memory_df.empty:
-        yesterday_entry = memory_df.iloc[-1]
-        # Check if last entry has none for ground truth and actual price
-        if yesterday_entry['Actual_Price'] == '-' and yesterday_entry['Ground_Truth_Change_Percentage'] == '-' and yesterday_entry['Ground_Truth_Decision'] == '-':
-            # Update the last entry with actual price and ground percentage
-            memory_df.at[memory_df.index[-1], 'Actual_Price'] = actual_price
-            memory_df.at[memory_df.index[-1],
-                         'Ground_Truth_Change_Percentage'] = ground_percentage
-
-            # Update ground_truth_decisin to evaluate and penelize the model decision after confirming the true stock movement (assuming a simple short term strategy)
-            # set the accepted change percentage threshold
-            accepted_threshold = 0.15
-
-            # 1: the model decision is correct/acceptable , 2: the model decision was incorrect
-            # if the change is less than the threshold, then any model decision is toleratable
-            if abs(ground_percentage) <= accepted_threshold:
-                memory_df.at[memory_df.index[-1], 'Ground_Truth_Decision'] = 1
-
-            # if the model decision was HOLD, then extend the threshold a little, as it may acceptable as well
-            elif memory_df.at[memory_df.index[-1], 'Decision'] == 'HOLD' and abs(ground_percentage) <= (accepted_threshold*2):
-                memory_df.at[memory_df.index[-1], 'Ground_Truth_Decision'] = 1
-
-            # otherwise, the change percentage is negative (drop in price) and the model last decision was SELL the shares
-            elif memory_df.at[memory_df.index[-1], 'Decision'] == 'SELL' and ground_percentage < 0:
-                # Then the model decision was correct
-                memory_df.at[memory_df.index[-1], 'Ground_Truth_Decision'] = 1
-
-            # otherwise, the change percentage is positive (increase in price) and the model last decision was BUY more shares
-            elif memory_df.at[memory_df.index[-1], 'Decision'] == 'BUY' and ground_percentage > 0:
-                # Then the model decision was correct
-                memory_df.at[memory_df.index[-1], 'Ground_Truth_Decision'] = 1
-
-            else:
-                memory_df.at[memory_df.index[-1], 'Ground_Truth_Decision'] = 0
-
-            # Save the updated DataFrame back to the Excel file
-            memory_df.to_excel('investment_memory.xlsx',
-                               index=False, engine='openpyxl')
-            print(
-                "Memory updated with today's actual price, ground change percentage, and ground truth decision.")
-        else:
-            print("Last entry already has contains ground truth.")
-    else:
+    if memory_df.empty:
         print("Memory is empty, nothing to update.")
+        return
+
+    entry_id = memory_df.index[-1]
+    yesterday_entry = memory_df.loc[entry_id]
 
+    # Check if last entry has none for ground truth and actual price
+    if not yesterday_entry[GROUND_TRUTH_COLUMNS].isna().all():
+        print("Last entry already has contains ground truth.")
+        return
+
+    # Evaluate the model decision after confirming the true stock movement (1: correct/acceptable, 0: incorrect)
+    ground_truth_decision = int(score_decisions(
+        [yesterday_entry['Decision']], [ground_percentage])[0])
+
+    ground_truth = {
+        'Actual_Price': float(actual_price),
+        'Ground_Truth_Change_Percentage': float(ground_percentage),
+        'Ground_Truth_Decision': ground_truth_decision
+    }
+
+    # Update the last entry in place with actual price, ground percentage and ground truth decision
+    if _cache.batch is not None:
+        _cache.batch.add_update(entry_id, ground_truth)
+    else:
+        with open_memory() as conn:
+            _update_entry(conn, entry_id, ground_truth)
+
+    _cache.update(entry_id, company_name, ground_truth)
+
+    print(
+        "Memory updated with today's actual price, ground change percentage, and ground truth decision.")
+
+
+# Re-score every labelled entry of a company with the ground truth rules (one vectorized pass)
+
+
+def rescore_memory(accepted_threshold=ACCEPTED_THRESHOLD, company_name="Aramco"):
+    memory_df = _cache.load(company_name)
+    labelled = memory_df[memory_df['Ground_Truth_Change_Percentage'].notna()]
+
+    rescored = labelled[['Datetime', 'Decision',
+                         'Ground_Truth_Change_Percentage', 'Ground_Truth_Decision']].reset_index(drop=True)
+    rescored['Rescored_Decision'] = score_decisions(
+        labelled['Decision'].to_numpy(), labelled['Ground_Truth_Change_Percentage'].to_numpy(),
+        accepted_threshold).astype(int)
+
+    return rescored
+
+# Accuracy curves of the labelling policy over a grid of thresholds (overall and per decision)
+
+
+def threshold_sweep(thresholds=None, company_name="Aramco"):
+    if thresholds is None:
+        thresholds = np.round(np.arange(0.0, 1.01, 0.05), 2)
+
+    memory_df = _cache.load(company_name)
+    labelled = memory_df[memory_df['Ground_Truth_Change_Percentage'].notna()]
+
+    return sweep_thresholds(labelled['Decision'].to_numpy(),
+                            labelled['Ground_Truth_Change_Percentage'].to_numpy(), thresholds)
 
 # Function to fetch the last 7 LSTM and Sentiment predictions for dashboard display
 
-def fetch_lists():
-    # Load the existing memory DataFrame
-    memory_df = pd.read_excel('investment_memory.xlsx', engine='openpyxl')
+def fetch_lists(company_name="Aramco"):
+    # get the last 7 predictions only
+    last_entries = _cache.load(company_name).tail(7)
 
     # Extract the 'Predicted_Price' and 'Sentiment_Score' columns as lists for dashboard display
-    lstm_list = memory_df['Predicted_Price'].tolist()
-    lstm_list = lstm_list[-7:]  # get the last 7 predictions only
-
-    sentiment_list = memory_df['Sentiment_Score'].tolist()
-    sentiment_list = sentiment_list[-7:]  # get the last 7 predictions only
+    lstm_list = last_entries['Predicted_Price'].tolist()
+    sentiment_list = last_entries['Sentiment_Score'].tolist()
 
     return [lstm_list, sentiment_list]
 
-# Function to get the last computed date in the memory
+# Function to fetch the memory entries of a company between two dates ('DD-MM-YYYY', inclusive)
+
+
+def fetch_entries(start_date, end_date, company_name="Aramco"):
+    memory_df = _cache.load(company_name)
+    in_range = memory_df['Date'].between(
+        to_iso_date(start_date), to_iso_date(end_date))
+
+    return memory_df.loc[in_range, MEMORY_COLUMNS].reset_index(drop=True)
+
+# Function to get the running accuracy statistics of a company (overall, per decision, per sentiment bucket and rolling windows)
+
+
+def accuracy_stats(company_name="Aramco"):
+    return _cache.get_accuracy_stats(company_name).summary()
+
+# Function to get the last computed date of a company in the memory
+
 
+def last_computed_date(company_name="Aramco"):
+    memory_df = _cache.load(company_name)
 
-def last_computed_date():
-    # Load the existing memory DataFrame
-    memory_df = pd.read_excel('investment_memory.xlsx', engine='openpyxl')
+    # Return the last known date (None if the memory is empty)
+    if memory_df.empty:
+        return None
 
-    # Return the last known date
     last_date = memory_df.iloc[-1]['Datetime']
     return last_date
@@ -0,0 +1,175 @@
+import heapq
+import math
+
+# Nearest-neighbour index used by the memory bank to retrieve similar past scenarios
+
+# KD-tree node: point coordinates, memory entry id and the two subtrees
+
+
+class _Node:
+    __slots__ = ("point", "entry_id", "axis", "left", "right")
+
+    def __init__(self, point, entry_id, axis):
+        self.point = point
+        self.entry_id = entry_id
+        self.axis = axis
+        self.left = None
+        self.right = None
+
+
+class SimilarityIndex:
+    """
+    Incremental KD-tree over (Predicted_Price, Predicted_Change_Percentage, Sentiment_Score).
+
+    Distances are normalized by the running standard deviation of each feature,
+    so no feature dominates the similarity only because of its units. Scaling an
+    axis does not change the tree structure, so the statistics can be updated on
+    every insertion without rebuilding.
+    """
+
+    def __init__(self, dims=3):
+        self.dims = dims
+        self.root = None
+        self.size = 0
+        self.max_depth = 0
+
+        # Running mean and sum of squared deviations per feature (Welford)
+        self._mean = [0.0] * dims
+        self._m2 = [0.0] * dims
+
+    # Build a balanced tree from a list of (entry_id, point) pairs
+
+    @classmethod
+    def build(cls, entries, dims=3):
+        index = cls(dims)
+        entries = [(entry_id, tuple(map(float, point)))
+                   for entry_id, point in entries if index._is_valid(point)]
+
+        for _, point in entries:
+            index._update_stats(point)
+            index.size += 1
+
+        index.root = index._build(entries, 0)
+        return index
+
+    def _build(self, entries, depth):
+        if not entries:
+            return None
+
+        self.max_depth = max(self.max_depth, depth + 1)
+
+        axis = depth % self.dims
+        entries.sort(key=lambda entry: entry[1][axis])
+        median = len(entries) // 2
+
+        node = _Node(entries[median][1], entries[median][0], axis)
+        node.left = self._build(entries[:median], depth + 1)
+        node.right = self._build(entries[median + 1:], depth + 1)
+        return node
+
+    def _is_valid(self, point):
+        return len(point) == self.dims and all(
+            value is not None and not math.isnan(float(value)) for value in point)
+
+    def _update_stats(self, point):
+        n = self.size + 1
+        for i, value in enumerate(point):
+            delta = value - self._mean[i]
+            self._mean[i] += delta / n
+            self._m2[i] += delta * (value - self._mean[i])
+
+    # Per-feature scale used to normalize distances (1 when the spread is unknown)
+
+    def scales(self):
+        if self.size < 2:
+            return [1.0] * self.dims
+
+        return [math.sqrt(max(m2, 0.0) / (self.size - 1)) or 1.0 for m2 in self._m2]
+
+    # Add one entry to the tree
+
+    def insert(self, entry_id, point):
+        if not self._is_valid(point):
+            return
+
+        point = tuple(map(float, point))
+        self._update_stats(point)
+        self.size += 1
+
+        if self.root is None:
+            self.root = _Node(point, entry_id, 0)
+            self.max_depth = 1
+            return
+
+        node, depth = self.root, 1
+        while True:
+            depth += 1
+            if point[node.axis] < node.point[node.axis]:
+                if node.left is None:
+                    node.left = _Node(
+                        point, entry_id, (node.axis + 1) % self.dims)
+                    break
+                node = node.left
+            else:
+                if node.right is None:
+                    node.right = _Node(
+                        point, entry_id, (node.axis + 1) % self.dims)
+                    break
+                node = node.right
+
+        self.max_depth = max(self.max_depth, depth)
+
+        # Rebalance when appends made the tree too deep for fast queries
+        if self.max_depth > 3 * math.log2(self.size + 1) + 4:
+            self._rebuild()
+
+    def _rebuild(self):
+        entries = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            entries.append((node.entry_id, node.point))
+            stack.extend(child for child in (node.left, node.right) if child)
+
+        self.max_depth = 0
+        self.root = self._build(entries, 0)
+
+    # Return the ids of the k nearest entries as a list of (distance, entry_id), closest first
+
+    def query(self, point, k=30):
+        if self.root is None or k <= 0 or not self._is_valid(point):
+            return []
+
+        point = tuple(map(float, point))
+        weights = [1.0 / (scale * scale) for scale in self.scales()]
+
+        # Max-heap of the best k candidates (negated squared distances)
+        best = []
+
+        # Depth-first search, each subtree carries its distance lower bound
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+
+            # Skip subtrees whose splitting plane is further than the current k-th neighbour
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+
+            dist = sum(w * (a - b) ** 2 for w, a,
+                       b in zip(weights, point, node.point))
+            if len(best) < k:
+                heapq.heappush(best, (-dist, node.entry_id))
+            elif dist < -best[0][0]:
+                heapq.heapreplace(best, (-dist, node.entry_id))
+
+            diff = point[node.axis] - node.point[node.axis]
+            near, far = (node.left, node.right) if diff < 0 else (
+                node.right, node.left)
+
+            # Visit the far side last, only if the splitting plane is close enough
+            if far is not None:
+                stack.append((far, max(bound, weights[node.axis] * diff * diff)))
+            if near is not None:
+                stack.append((near, bound))
+
+        return sorted((math.sqrt(-neg_dist), entry_id) for neg_dist, entry_id in best)
@@ -0,0 +1,150 @@
+from collections import deque
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+# Running accuracy aggregates of the memory bank, updated as ground truth labels arrive
+
+# Rolling windows (in calendar days) reported by the dashboard
+ROLLING_WINDOWS = [7, 30, 90]
+
+# Accepted change percentage threshold under which any decision is tolerated
+ACCEPTED_THRESHOLD = 0.15
+
+# Map a sentiment score to the buckets used by the dashboard summary
+
+
+def sentiment_bucket(score):
+    if score is None or score != score or score < 0:
+        return "unavailable"
+    if score > 0.8:
+        return "strong_positive"
+    if score > 0.5:
+        return "positive"
+    if score < 0.2:
+        return "strong_negative"
+    if score < 0.5:
+        return "negative"
+    return "neutral"
+
+# Ground truth labelling rules (assuming a simple short term strategy), vectorized over many entries
+# and optionally over a grid of thresholds: returns 1 (correct/acceptable) or 0 (incorrect) per entry
+
+
+def score_decisions(decisions, ground_percentages, accepted_threshold=ACCEPTED_THRESHOLD):
+    decisions = np.asarray(decisions, dtype=object)
+    change = np.asarray(ground_percentages, dtype=float)
+    threshold = np.asarray(accepted_threshold, dtype=float)
+
+    # A grid of thresholds gives one row of labels per threshold
+    if threshold.ndim > 0:
+        threshold = threshold[:, np.newaxis]
+
+    # if the change is less than the threshold, then any model decision is toleratable
+    tolerated = np.abs(change) <= threshold
+
+    # if the model decision was HOLD, then extend the threshold a little, as it may acceptable as well
+    hold = (decisions == 'HOLD') & (np.abs(change) <= threshold * 2)
+
+    # the change percentage is negative (drop in price) and the model decision was SELL the shares
+    sell = (decisions == 'SELL') & (change < 0)
+
+    # the change percentage is positive (increase in price) and the model decision was BUY more shares
+    buy = (decisions == 'BUY') & (change > 0)
+
+    return (tolerated | hold | sell | buy).astype(np.int8)
+
+# Accuracy (%) per threshold, overall and per decision, computed in one broadcasted pass
+
+
+def sweep_thresholds(decisions, ground_percentages, thresholds):
+    decisions = np.asarray(decisions, dtype=object)
+    thresholds = np.atleast_1d(np.asarray(thresholds, dtype=float))
+
+    # (thresholds x entries) matrix of labels
+    correct = score_decisions(decisions, ground_percentages, thresholds)
+
+    curves = pd.DataFrame({"threshold": thresholds})
+    curves["accuracy"] = correct.mean(axis=1) * 100 if correct.shape[1] else 0.0
+    for decision in ['BUY', 'HOLD', 'SELL']:
+        mask = decisions == decision
+        curves[f"accuracy_{decision}"] = correct[:, mask].mean(
+            axis=1) * 100 if mask.any() else np.nan
+
+    return curves.round(2)
+
+# Summarize a [correct, total] counter as a dict (accuracy in %)
+
+
+def _summary(correct, total):
+    return {
+        "correct": correct,
+        "total": total,
+        "accuracy": round(correct / total * 100, 2) if total > 0 else 0
+    }
+
+
+class AccuracyStats:
+    """
+    Accuracy of the labelled memory entries: overall, per decision, per sentiment
+    bucket and over rolling windows ending at the latest labelled date.
+
+    Every counter is updated in O(1) (amortized for the rolling windows) when a
+    new ground truth label is added, so reading the statistics costs nothing.
+    """
+
+    def __init__(self, windows=ROLLING_WINDOWS):
+        self.overall = [0, 0]
+        self.by_decision = {}
+        self.by_sentiment = {}
+
+        # Per window: labels inside the window (date, correct) and their running sums
+        self.windows = {days: deque() for days in windows}
+        self.window_counts = {days: [0, 0] for days in windows}
+        self.last_date = None
+
+    # Build the statistics from (date, decision, sentiment_score, correct) records
+
+    @classmethod
+    def build(cls, records, windows=ROLLING_WINDOWS):
+        stats = cls(windows)
+        for record in sorted(records, key=lambda record: record[0]):
+            stats.add(*record)
+        return stats
+
+    # Add one labelled entry ('YYYY-MM-DD' date, correct is 1 or 0)
+
+    def add(self, entry_date, decision, sentiment_score, correct):
+        correct = int(correct)
+        entry_date = date.fromisoformat(entry_date)
+
+        for counter in (self.overall,
+                        self.by_decision.setdefault(decision, [0, 0]),
+                        self.by_sentiment.setdefault(sentiment_bucket(sentiment_score), [0, 0])):
+            counter[0] += correct
+            counter[1] += 1
+
+        if self.last_date is None or entry_date > self.last_date:
+            self.last_date = entry_date
+
+        for days, window in self.windows.items():
+            counts = self.window_counts[days]
+            window.append((entry_date, correct))
+            counts[0] += correct
+            counts[1] += 1
+
+            # Drop labels that left the window
+            start = self.last_date - timedelta(days=days - 1)
+            while window and window[0][0] < start:
+                _, old_correct = window.popleft()
+                counts[0] -= old_correct
+                counts[1] -= 1
+
+    def summary(self):
+        return {
+            "overall": _summary(*self.overall),
+            "by_decision": {decision: _summary(*counts) for decision, counts in self.by_decision.items()},
+            "by_sentiment": {bucket: _summary(*counts) for bucket, counts in self.by_sentiment.items()},
+            "rolling": {f"{days}d": _summary(*counts) for days, counts in self.window_counts.items()},
+            "as_of": self.last_date.strftime("%d-%m-%Y") if self.last_date else None
+        }
@@ -1,13 +1,44 @@
+import asyncio
+from collections import deque
 import nest_asyncio
 import pandas as pd
 import re
-from twscrape import API, gather
+import time
+import torch
+from concurrent.futures import ThreadPoolExecutor
+from sentiment_cache import lookup_scores, open_sentiment_db, store_scores, tweet_key
+from tweet_archive import (TWEET_COLUMNS, load_tweets, mark_synced, missing_windows, open_archive,
+                           store_tweets)
+from twscrape import API
 from twscrape.logger import set_log_level
 from transformers import pipeline
 import warnings
 
 warnings.filterwarnings("ignore")
 
+# Tweets scored per forward pass
+SENTIMENT_BATCH_SIZE = 32
+
+# Maximum tokens per tweet (longer tweets are truncated)
+SENTIMENT_MAX_LENGTH = 512
+
+# Model inference runs in this bounded pool, off the event loop (one worker per language leg)
+SENTIMENT_WORKERS = 2
+_inference_executor = ThreadPoolExecutor(
+    max_workers=SENTIMENT_WORKERS, thread_name_prefix="sentiment")
+
+# Patterns a tweet must contain to be scored, compiled once at import
+ARABIC_PATTERN = re.compile(r"(سهم\s*[أا]رامكو|سهم\s*#?[أا]رامكو)", re.IGNORECASE)
+
+# Keywords/phrases to match in English tweets (case-insensitive)
+ENGLISH_KEYWORDS = [
+    "ARAMCO", "Aramco", "aramco", "Stock", "stock", "Shares", "shares", "Price", "price", "Earnings",
+    "earnings", "Aramco price", "Aramco earnings", "Aramco results", "Dividend", "dividend", "2222.TAD",
+    "Saudi oil exports", "saudi oil exports", "IPO", "TASI", "Tadawul", "tadawul"
+]
+ENGLISH_PATTERN = re.compile(
+    r"|".join([re.escape(k) for k in ENGLISH_KEYWORDS]), re.IGNORECASE)
+
 # Load the models once only
 
 
@@ -33,56 +64,248 @@ def load_sentiment():
 
     return [arabert_sentiment, finbert_sentiment]
 
-# Send query to scrape Arabic tweets about Aramco stock
+# twscrape API client, created once per process (uses stored logged-in sessions)
+_api = None
 
 
-async def scrape_twitter(query, max_tweets=500):
-    """
-    Function to send a query to the twscrape API.
-    """
-    # Patch asyncio to allow nested event loops
+def get_api():
+    global _api
+
+    if _api is None:
+        # Patch asyncio to allow nested event loops
+
+        # This is necessary for environments like Jupyter notebooks
+        nest_asyncio.apply()
+        # Optional: increase verbosity
+        set_log_level("INFO")
+
+        _api = API()
+
+    return _api
 
-    # This is necessary for environments like Jupyter notebooks
-    nest_asyncio.apply()
-    # Optional: increase verbosity
-    set_log_level("INFO")
+# Convert a twscrape tweet to a row of a tweets frame
 
-    api = API()  # uses stored logged-in sessions
 
-    tweets = []
+def tweet_row(tweet):
+    return {
+        "Tweet ID": tweet.id,
+        "Date": tweet.date,
+        "Username": tweet.user.username,
+        "Display Name": tweet.user.displayname,
+        "Followers": tweet.user.followersCount,
+        "Content": tweet.rawContent,
+        "Tweet URL": f"https://twitter.com/{tweet.user.username}/status/{tweet.id}"
+    }
 
+# Scrape a window of a query ('YYYY-MM-DD' dates, until excluded) for at most 'limit' tweets and yield the new ones as they arrive. They are archived every 'chunk_size' tweets
+# and the window is marked as synced once it is completely scraped
+
+
+async def scrape_window(query, since, until, limit, chunk_size=SENTIMENT_BATCH_SIZE):
+    dated_query = f"{query} since:{since} until:{until}"
+
+    seen = set()
+    chunk = []
+    scraped = 0
     try:
-        retrieved = await gather(api.search(query, limit=max_tweets, kv={"product": "Top"}))
-        print(f"\n✅ Scraped {len(retrieved)} tweets about Aramco stock")
+        async for tweet in get_api().search(dated_query, limit=limit, kv={"product": "Top"}):
+            scraped += 1
+            row = tweet_row(tweet)
+            if row["Tweet ID"] in seen:
+                continue
+            seen.add(row["Tweet ID"])
+            chunk.append(row)
+            yield row
+
+            if len(chunk) == chunk_size:
+                with open_archive() as conn:
+                    store_tweets(conn, query, pd.DataFrame(
+                        chunk, columns=TWEET_COLUMNS))
+                chunk = []
 
     except Exception as e:
+        # Nothing is marked as synced, the window is scraped again next time
         print(f"Error during tweet scraping: {e}")
-
-    if len(retrieved) > 0:
-        # Iterate through tweets found by the API search
-        for tweet in retrieved:
-            tweets.append({
-                "Date": tweet.date,
-                "Username": tweet.user.username,
-                "Display Name": tweet.user.displayname,
-                "Followers": tweet.user.followersCount,
-                "Content": tweet.rawContent,
-                "Tweet URL": f"https://twitter.com/{tweet.user.username}/status/{tweet.id}"
-            })
+        synced = False
     else:
+        # A window cut at the search limit may still miss tweets, and "Top" results are not in date
+        # order so no part of it is known to be complete: it is scraped again next time
+        synced = scraped < limit
+
+    with open_archive() as conn:
+        store_tweets(conn, query, pd.DataFrame(
+            chunk, columns=TWEET_COLUMNS))
+        if synced:
+            mark_synced(conn, query, since, until)
+
+# Yield the newest 'max_tweets' tweets (rows of a tweets frame) matching a query between start_date
+# (included) and end_date (excluded), both 'YYYY-MM-DD'. The dates the local archive does not cover
+# yet are scraped first, each window up to max_tweets of its own. Tweets of the window ending at
+# end_date (newer than the archived ones) are yielded as they are scraped, then the quota is filled
+# with the newest archived tweets, read page by page
+
+
+async def stream_tweets(query, start_date, end_date, max_tweets=500, chunk_size=SENTIMENT_BATCH_SIZE):
+    with open_archive() as conn:
+        windows = missing_windows(conn, query, start_date, end_date)
+
+    streamed = set()
+    scraped = 0
+
+    # Newest window first, so its tweets reach the consumer while the older windows are scraped
+    for since, until in reversed(windows):
+        newest = until == end_date
+        async for tweet in scrape_window(query, since, until, max_tweets, chunk_size):
+            scraped += 1
+
+            # The search may return tweets outside the window, they are only archived
+            in_window = start_date <= pd.Timestamp(tweet["Date"]).isoformat() < end_date
+            if newest and in_window and len(streamed) < max_tweets:
+                streamed.add(tweet["Tweet ID"])
+                yield tweet
+
+    # The streamed tweets are the newest of the archive, skip them while filling the quota
+    yielded = len(streamed)
+    offset = 0
+    while yielded < max_tweets:
+        with open_archive() as conn:
+            page = load_tweets(conn, query, start_date,
+                               end_date, chunk_size, offset)
+        offset += len(page)
+
+        for tweet in page.to_dict("records"):
+            if yielded >= max_tweets:
+                break
+            if tweet["Tweet ID"] in streamed:
+                continue
+            yielded += 1
+            yield tweet
+
+        if len(page) < chunk_size:
+            break
+
+    print(
+        f"\n✅ {yielded} tweets about Aramco stock ({scraped} newly scraped)")
+    if yielded == 0:
         print("0 tweets retrieved..", end="\n\n")
 
-    return pd.DataFrame(tweets)
+# Score texts with a loaded sentiment pipeline, batch by batch.
+# Texts are sorted by token length so each batch holds tweets of similar length, and every batch is
+# padded only to its own longest tweet. Returns the pipeline's format ({"label", "score"} per text,
+# in the input order)
+
+
+def score_texts(classifier, texts, batch_size=SENTIMENT_BATCH_SIZE, max_length=SENTIMENT_MAX_LENGTH):
+    if len(texts) == 0:
+        return []
+
+    tokenizer, model = classifier.tokenizer, classifier.model
+    max_length = min(max_length, tokenizer.model_max_length)
+
+    # Tokenize without padding, only to know each text's length
+    encodings = tokenizer(list(texts), truncation=True, max_length=max_length)
+    order = sorted(range(len(texts)),
+                   key=lambda i: len(encodings["input_ids"][i]))
+
+    results = [None] * len(texts)
+    with torch.inference_mode():
+        for batch_start in range(0, len(order), batch_size):
+            batch = order[batch_start:batch_start + batch_size]
+
+            # Dynamic padding to the longest text of the batch
+            inputs = tokenizer.pad([{key: values[i] for key, values in encodings.items()} for i in batch],
+                                   return_tensors="pt").to(model.device)
+            probabilities = model(**inputs).logits.softmax(dim=-1)
+            scores, label_ids = probabilities.max(dim=-1)
+
+            for i, score, label_id in zip(batch, scores.tolist(), label_ids.tolist()):
+                results[i] = {"label": model.config.id2label[label_id], "score": score}
 
-# filter tweets to exclude unwanted content
+    return results
 
+# Score a tweets frame ("Tweet ID" and "Content" columns), only sending the tweets that are not in the
+# sentiment cache through the model. Returns the results in the frame's order, the number of tweets
+# scored by the model and the time (seconds) the model took
 
-def filter_tweets(twts, pattern):
-    # Keep only tweets containing the pattern in the Content
-    twts_filtered = twts[twts["Content"].str.contains(
-        pattern, case=False, na=False)]
 
-    return twts_filtered
+def score_tweets(classifier, tweets, batch_size=SENTIMENT_BATCH_SIZE):
+    model_name = classifier.model.name_or_path
+    contents = tweets["Content"].tolist()
+    tweet_ids = tweets["Tweet ID"].tolist() if "Tweet ID" in tweets else [None] * len(contents)
+    keys = [tweet_key(tweet_id, content)
+            for tweet_id, content in zip(tweet_ids, contents)]
+
+    with open_sentiment_db() as conn:
+        cached = lookup_scores(conn, model_name, keys)
+
+    # Score every unseen tweet once
+    content_by_key = dict(zip(keys, contents))
+    new_keys = [key for key in content_by_key if key not in cached]
+    start = time.perf_counter()
+    new_results = dict(zip(new_keys, score_texts(
+        classifier, [content_by_key[key] for key in new_keys], batch_size)))
+    elapsed = time.perf_counter() - start
+
+    if new_results:
+        with open_sentiment_db() as conn:
+            store_scores(conn, model_name, new_results)
+
+    return [cached[key] if key in cached else new_results[key] for key in keys], len(new_keys), elapsed
+
+# Awaitable version of score_tweets, the inference runs in the bounded sentiment pool
+
+
+async def score_tweets_async(classifier, tweets, batch_size=SENTIMENT_BATCH_SIZE):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_inference_executor, score_tweets, classifier, tweets, batch_size)
+
+# Filter streamed tweets with a compiled pattern and score them in micro-batches of 'batch_size' as
+# they arrive (sorted by length within each batch), so scoring overlaps the scraping. At most
+# SENTIMENT_WORKERS batches are in flight, so only a few batches of tweets are held in memory at once.
+# Returns the number of tweets received and the sentiment results of the matching ones
+
+
+async def score_stream(classifier, tweets, pattern, batch_size=SENTIMENT_BATCH_SIZE):
+    received = 0
+    batch = []
+    pending = deque()
+    sentiment_results = []
+    new = 0
+    model_seconds = 0.0
+
+    async for tweet in tweets:
+        received += 1
+        if isinstance(tweet["Content"], str) and pattern.search(tweet["Content"]):
+            batch.append(tweet)
+
+        if len(batch) == batch_size:
+            pending.append(asyncio.ensure_future(score_tweets_async(
+                classifier, pd.DataFrame(batch, columns=TWEET_COLUMNS), batch_size)))
+            batch = []
+
+            # Wait for the oldest batch before reading more tweets
+            if len(pending) > SENTIMENT_WORKERS:
+                results, scored, seconds = await pending.popleft()
+                sentiment_results.extend(results)
+                new += scored
+                model_seconds += seconds
+
+    if batch:
+        pending.append(asyncio.ensure_future(score_tweets_async(
+            classifier, pd.DataFrame(batch, columns=TWEET_COLUMNS), batch_size)))
+
+    for scoring in pending:
+        results, scored, seconds = await scoring
+        sentiment_results.extend(results)
+        new += scored
+        model_seconds += seconds
+
+    print(f"Sentiment cache: {len(sentiment_results) - new} cached, {new} new tweets")
+    if model_seconds > 0:
+        print(f"Scored {new} tweets in {model_seconds:.2f}s "
+              f"({new / model_seconds:.1f} tweets/s)")
+
+    return received, sentiment_results
 
 # Compute sentiment scores for Arabic and English tweets
 
@@ -112,26 +335,15 @@ async def analyze_arabic_sentiment(arabert_sentiment, start_date, end_date):
         '"سهم أرامكو" OR "أسهم أرامكو" OR "تاسي أرامكو" OR "أرامكو تداول" OR "أرامكو سعر السهم" '
         '-تيليجرام -سناب -توصية -توصيات -توصيتين -توصيتك -اشترك -أرسل -ارسل -دعاية -اعلان -تم -يراسلني -يرسل -يرسلوا -قروب -تواصل -بالخاص -راسلنا -واتساب -تفضل -الاستفسار -للاستفسار -بالاستفسار -المبتعثين -للتواصل -معه -معنا -يتواصل -يتواصلوا -راسلني -الخاص -الواتساب -انضم -يراسلي -توصياتنا -ارسلوا -شاركنا -القناة -قناة -تابع -يبي -الجلسة -مبارك -الجروب -الاستشارات'
         'lang:ar '
-        # Start date for scraping (for the current test example)
-        f'since:{start_date} '  # Star
-        f'until:{end_date} '  # End date for scraping
         '-filter:replies '
-        '-filter:retweets '
+        '-filter:retweets'
     )
 
-    # Fetch Arabic tweets using the send_query function
-    arabic_twts = await scrape_twitter(query)
-
-    if len(arabic_twts) > 0:
-        # Set the pattern to filter tweets
-        pattern = r"(سهم\s*[أا]رامكو|سهم\s*#?[أا]رامكو)"
+    # Stream Arabic tweets between the dates (only new tweets are scraped), filtered and scored on the fly
+    received, sentiment_results = await score_stream(
+        arabert_sentiment, stream_tweets(query, start_date, end_date), ARABIC_PATTERN)
 
-        # Filter the tweets to keep only those containing the pattern
-        arabic_twts = filter_tweets(arabic_twts, pattern)
-
-        # Analyze sentiments
-        sentiment_results = arabert_sentiment(
-            arabic_twts["Content"].tolist(), truncation=True)
+    if received > 0:
         print(f"✅ Arabic sentiment analysis complete.")
 
         # Compute sentiment score
@@ -156,33 +368,15 @@ async def analyze_english_sentiment(finbert_sentiment, start_date, end_date):
     query = (
         '"Aramco stock" OR "Aramco shares" OR "Aramco price" OR "Aramco earnings" OR "Aramco results" OR "Aramco dividend" OR "2222.TAD" OR "Aramco IPO" OR "Aramco TASI" OR "Aramco Tadawul" OR "Saudi Oil prices" OR "Saudi Oil exports"'
         'lang:en '
-        # Start date for scraping (for the current test example)
-        f'since:{start_date} '  # Start date for scraping
-        f'until:{end_date} '  # End date for scraping
-        '-filter:retweets '
+        '-filter:retweets'
     )
 
-    # Fetch English tweets using the send_query function
-    english_twts = await scrape_twitter(query)
-
-    # Check if retrieved tweets dataframe is not empty
-    if len(english_twts) > 0:
-        # Define keywords/phrases to match (case-insensitive)
-        keywords = [
-            "ARAMCO", "Aramco", "aramco", "Stock", "stock", "Shares", "shares", "Price", "price", "Earnings",
-            "earnings", "Aramco price", "Aramco earnings", "Aramco results", "Dividend", "dividend", "2222.TAD",
-            "Saudi oil exports", "saudi oil exports", "IPO", "TASI", "Tadawul", "tadawul"
-        ]
-
-        # Build regex pattern to match any of the keywords/phrases
-        pattern = r"|".join([re.escape(k) for k in keywords])
+    # Stream English tweets between the dates (only new tweets are scraped), filtered and scored on the fly
+    received, sentiment_results = await score_stream(
+        finbert_sentiment, stream_tweets(query, start_date, end_date), ENGLISH_PATTERN)
 
-        # Filter the tweets to keep only those containing the pattern
-        english_twts = filter_tweets(english_twts, pattern)
-
-        # Analyze sentiments on filtered English tweets
-        sentiment_results = finbert_sentiment(
-            english_twts["Content"].tolist(), truncation=True)
+    # Check if any tweet was retrieved
+    if received > 0:
         print(f"✅ English sentiment analysis complete.")
 
         # Analyze sentiment results
@@ -201,11 +395,10 @@ async def analyze_english_sentiment(finbert_sentiment, start_date, end_date):
 
 async def analyze_sentiment(arabert, finbert, start_date, end_date):
 
-    # analyze arabic sentiment
-    arabic_score = await analyze_arabic_sentiment(arabert, start_date, end_date)
-
-    # analyze english sentiment
-    english_score = await analyze_english_sentiment(finbert, start_date, end_date)
+    # analyze arabic and english sentiment concurrently (scraping overlaps, inference runs off the event loop)
+    arabic_score, english_score = await asyncio.gather(
+        analyze_arabic_sentiment(arabert, start_date, end_date),
+        analyze_english_sentiment(finbert, start_date, end_date))
 
     # Combine scores
     if arabic_score > -1 and english_score > -1:
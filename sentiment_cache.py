@@ -0,0 +1,87 @@
+import hashlib
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# Persistent per-tweet sentiment results, so overlapping scraping windows only score unseen tweets
+
+SENTIMENT_DB = 'sentiment_cache.db'
+
+# Cached results kept per database, the least recently used ones are evicted beyond this size
+SENTIMENT_CACHE_MAX_ENTRIES = 200_000
+
+# Keys per SQL statement (below SQLite's host parameter limit)
+QUERY_CHUNK = 500
+
+SENTIMENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    model TEXT NOT NULL,
+    tweet_key TEXT NOT NULL,
+    label TEXT NOT NULL,
+    score REAL NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (model, tweet_key)
+);
+CREATE INDEX IF NOT EXISTS idx_scores_used_at ON scores (used_at);
+"""
+
+
+@contextmanager
+def open_sentiment_db():
+    conn = sqlite3.connect(SENTIMENT_DB, timeout=30)
+    try:
+        with conn:
+            conn.executescript(SENTIMENT_SCHEMA)
+
+        # Commit on success, rollback on failure
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+# Cache key of a tweet: its ID when known, otherwise a hash of its content
+
+
+def tweet_key(tweet_id, content):
+    if tweet_id is not None and tweet_id == tweet_id and str(tweet_id) != "":
+        return f"id:{tweet_id}"
+
+    return "sha1:" + hashlib.sha1(str(content).encode("utf-8")).hexdigest()
+
+# Return the cached {"label", "score"} results of a model as a dict keyed by tweet key
+
+
+def lookup_scores(conn, model_name, keys):
+    keys = list(dict.fromkeys(keys))
+    cached = {}
+
+    for start in range(0, len(keys), QUERY_CHUNK):
+        chunk = keys[start:start + QUERY_CHUNK]
+        placeholders = ", ".join(["?"] * len(chunk))
+        rows = conn.execute(
+            f"SELECT tweet_key, label, score FROM scores WHERE model = ? AND tweet_key IN ({placeholders})",
+            (model_name, *chunk)).fetchall()
+        cached.update({key: {"label": label, "score": score}
+                      for key, label, score in rows})
+
+        # Hits count as recent use for the eviction
+        conn.execute(
+            f"UPDATE scores SET used_at = ? WHERE model = ? AND tweet_key IN ({placeholders})",
+            (time.time(), model_name, *chunk))
+
+    return cached
+
+# Store new results ({tweet key: {"label", "score"}}) and evict the least recently used beyond max_entries
+
+
+def store_scores(conn, model_name, results, max_entries=SENTIMENT_CACHE_MAX_ENTRIES):
+    now = time.time()
+    conn.executemany(
+        "INSERT OR REPLACE INTO scores (model, tweet_key, label, score, used_at) VALUES (?, ?, ?, ?, ?)",
+        [(model_name, key, result["label"], result["score"], now) for key, result in results.items()])
+
+    excess = conn.execute(
+        "SELECT COUNT(*) FROM scores").fetchone()[0] - max_entries
+    if excess > 0:
+        conn.execute(
+            "DELETE FROM scores WHERE rowid IN (SELECT rowid FROM scores ORDER BY used_at LIMIT ?)", (excess,))
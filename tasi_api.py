@@ -1,38 +1,325 @@
 # tadawul_scraper.py
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
 import requests
 import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 import pandas as pd
-from bs4 import BeautifulSoup
 
-# Retrieve fresh cookies for every new session
+# Local store of the daily bars already downloaded from the exchange
+MARKET_DB = 'market_data.db'
 
+# Saudi Exchange portal endpoints
+BOOTSTRAP_URL = "https://www.saudiexchange.sa/wps/portal/saudiexchange/home/"
 
-def get_fresh_cookies():
-    session = requests.Session()
-    bootstrap_url = "https://www.saudiexchange.sa/wps/portal/saudiexchange/home/"
-    session.get(bootstrap_url)
+HISTORICAL_URL = 'https://www.saudiexchange.sa/wps/portal/saudiexchange/newsandreports/reports-publications/historical-reports/!ut/p/z1/lY9NDsIgFITP0gMYRhRki8ZSE2uLFK1sDAtjSBRdGM9v4078SZ3dS755M0McaYmL_h6O_hYu0Z-6e-f4nkkOWghUKJoZOIzithFDOh-T7SsgSsWhV1JXdMKgNiDuLz9MzaDzuhwtsYYC7-fHF8ke-S5BtBVdA5NPmQCFQQp8mJh8eN_wBH6UNIdIrmdrW4TFQGbZA6as4Ag!/p0/IZ7_5A602H80O0HTC060SG6UT81216=CZ6_5A602H80O0HTC060SG6UT812E4=NJpopulateCompanyDetails=/'
 
-    return session.cookies.get_dict()
+HEADERS = {
+    'accept': 'application/json, text/javascript, */*; q=0.01',
+    'content-type': 'application/x-www-form-urlencoded; charset=UTF-8',
+    'origin': 'https://www.saudiexchange.sa',
+    'referer': 'https://www.saudiexchange.sa/wps/portal/saudiexchange/newsandreports/reports-publications/historical-reports/!ut/p/z1/04_Sj9CPykssy0xPLMnMz0vMAfIjo8ziTR3NDIw8LAz8DTxCnA3MDILdzUJDLAyNXE30I4EKzHEqMDTTDyekoCA7zRMAIkY09Q!!/',
+    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
+    'x-requested-with': 'XMLHttpRequest',
+}
+
+# Portal cookies are reused for this many seconds
+COOKIE_TTL = 30 * 60
+
+# Sector of the default entity (Aramco, '2222')
+DEFAULT_SECTOR = 'TENI:31'
+
+# Rows per page returned by the historical reports endpoint
+PAGE_SIZE = 100
+
+# Polite request rate to the exchange (requests per second, and burst size)
+REQUESTS_PER_SECOND = 1
+REQUEST_BURST = 4
+
+# Extra calendar days covering holidays when sizing a "latest N trading days" request,
+# and how many times the span may be doubled if it still holds fewer trading days
+HOLIDAY_MARGIN = 4
+MAX_SPAN_DOUBLINGS = 4
+
+# Text of the priceUp/priceDown div in the change cells
+PRICE_CELL_PATTERN = re.compile(
+    r'<div[^>]*class\s*=\s*["\'][^"\']*\bprice(?:Up|Down)\b[^"\']*["\'][^>]*>([^<]*)<')
+
+# Characters to drop before converting the cells to numbers
+NUMBER_NOISE_PATTERN = re.compile(r"[%,\s\u00a0]")
+THOUSANDS_NOISE_PATTERN = re.compile(r"[,\-\s\u00a0]")
+
+# Payload fields identifying a page in recordings
+RECORD_KEY_FIELDS = ['selectedSector', 'selectedEntity',
+                     'startDate', 'endDate', 'start', 'length']
+
+# Bar columns in the order expected by the LSTM scaler
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume',
+               'Turnover', 'NoOfTrades', 'change', 'changePercent']
+
+MARKET_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS bars (
+    entity_id TEXT NOT NULL,
+    Date TEXT NOT NULL,
+    {', '.join(f'{col} REAL' for col in BAR_COLUMNS)},
+    PRIMARY KEY (entity_id, Date)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    entity_id TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_coverage_entity ON coverage (entity_id);
+"""
+
+# Pooled HTTP session shared by every request to the exchange
+
+
+class TadawulSession:
+    """
+    Long-lived session for the Saudi Exchange portal.
+
+    Connections are kept alive in a pool, so paginated requests reuse the same
+    TLS connection. Portal cookies are cached for 'cookie_ttl' seconds and
+    refreshed transparently when they expire or the portal answers 401/403.
+    """
+
+    def __init__(self, cookie_ttl=COOKIE_TTL, pool_size=16):
+        self.cookie_ttl = cookie_ttl
+        self.cookies_time = None
+        self.generation = 0
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+
+        # Keep-alive connection pool, with retries on transient server errors
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=Retry(total=3, backoff_factor=0.5,
+                                                status_forcelist=[429, 500, 502, 503, 504],
+                                                allowed_methods=["GET", "POST"]))
+        self.session.mount("https://", adapter)
+
+    # Retrieve fresh cookies from the portal home page. 'generation' is the cookies generation the
+    # caller used: if another thread already refreshed them since, the refresh is skipped
+
+    def refresh_cookies(self, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            self.session.cookies.clear()
+            self.session.get(BOOTSTRAP_URL)
+            self.cookies_time = time.monotonic()
+            self.generation += 1
+
+    def cookies_expired(self):
+        return self.cookies_time is None or time.monotonic() - self.cookies_time > self.cookie_ttl
+
+    def post(self, url, data):
+        generation = self.generation
+        if self.cookies_expired():
+            self.refresh_cookies(generation)
+
+        generation = self.generation
+        res = self.session.post(url, data=data)
+
+        # Cookies rejected by the portal, refresh them (unless already done meanwhile) and retry once
+        if res.status_code in (401, 403):
+            self.refresh_cookies(generation)
+            res = self.session.post(url, data=data)
+
+        res.raise_for_status()
+        return res
+
+
+_session = None
+
+# Return the process-wide session (created on first use)
+
+
+def get_session():
+    global _session
+
+    if _session is None:
+        _session = TadawulSession()
+
+    return _session
+
+# Transports: how a page request reaches the exchange (live, recorded to disk, or replayed from disk)
+
+
+class LiveTransport:
+    """Sends page requests to saudiexchange.sa over the shared pooled session."""
+
+    rate_limited = True
+
+    def fetch(self, payload):
+        return get_session().post(HISTORICAL_URL, data=payload).json()
+
+# Key identifying a page request in a recording
+
+
+def page_key(payload):
+    request = {field: payload[field] for field in RECORD_KEY_FIELDS}
+    digest = hashlib.sha1(json.dumps(
+        request, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return request, f"{payload['selectedEntity']}_{digest}.json"
+
+
+class RecordingTransport:
+    """Forwards page requests to another transport and saves every JSON page in 'directory'."""
+
+    def __init__(self, directory, inner=None):
+        self.directory = directory
+        self.inner = inner or LiveTransport()
+        self.rate_limited = self.inner.rate_limited
+        os.makedirs(directory, exist_ok=True)
+
+    def fetch(self, payload):
+        response = self.inner.fetch(payload)
+
+        request, filename = page_key(payload)
+        with open(os.path.join(self.directory, filename), "w", encoding="utf-8") as file:
+            json.dump({"request": request, "response": response},
+                      file, ensure_ascii=False)
+
+        return response
+
+
+class ReplayTransport:
+    """
+    Serves page requests from a recording made by RecordingTransport, with no network.
+
+    'latency' seconds are slept per page to mimic the exchange; requests that
+    were not recorded raise a KeyError.
+    """
+
+    rate_limited = False
+
+    def __init__(self, directory, latency=0.0):
+        self.directory = directory
+        self.latency = latency
+
+    def fetch(self, payload):
+        _, filename = page_key(payload)
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            raise KeyError(
+                f"No recorded page for {page_key(payload)[0]} in {self.directory}")
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)["response"]
+
+
+_transport = None
+
+# Return the transport used for page requests (live by default)
+
+
+def get_transport():
+    global _transport
+
+    if _transport is None:
+        _transport = LiveTransport()
+
+    return _transport
+
+# Replace the transport used for page requests and return the previous one
+
+
+def set_transport(transport):
+    global _transport
+
+    previous, _transport = _transport, transport
+    return previous
+
+# Token bucket rate limiter shared by sync and async downloads
+
+
+class RateLimiter:
+    """
+    Allows 'rate' requests per second on average, with bursts of up to 'capacity' requests.
+
+    Callers reserve a token and sleep until it becomes available, so the limiter
+    needs no lock on the event loop and spaces requests exactly instead of
+    sleeping a fixed time after every page.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=REQUEST_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Reserve one token and return how long to wait before using it
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens +
+                              (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            return max(0.0, -self.tokens / self.rate)
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_rate_limiter = None
+
+# Return the process-wide rate limiter (created on first use)
+
+
+def get_rate_limiter():
+    global _rate_limiter
+
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+
+    return _rate_limiter
 
 # Build session payload
 
 
-def build_payload(start, start_date, end_date):
+def build_payload(start, start_date, end_date, length=PAGE_SIZE, sector_id=DEFAULT_SECTOR):
     # Your payload logic stays here
     return {
         'draw': '1',
         'start': str(start),
-        'length': '100',
+        'length': str(length),
         'search[value]': '',
         'search[regex]': 'false',
         'selectedMarket': 'MAIN',
-        'selectedSector': 'TENI:31',
+        'selectedSector': sector_id,
         'selectedEntity': '2222',
         'startDate': start_date,
         'endDate': end_date,
         'tableTabId': '0',
         'startIndex': str(start),
-        'endIndex': str(start + 99),
+        'endIndex': str(start + length - 1),
         # The rest of the column definitions here...
         'columns[0][data]': 'transactionDateStr',
         'columns[0][name]': '',
@@ -96,21 +383,20 @@ def build_payload(start, start_date, end_date):
         'columns[9][search][regex]': 'false',
     }
 
-# Extract change and changePercent from HTML strings
+# Extract change and changePercent from the priceUp/priceDown HTML cells of a whole column (0 when missing)
 
 
-def extract_change(html_str):
-    soup = BeautifulSoup(html_str, "html.parser")
-    div = soup.find("div", class_="priceDown") or soup.find(
-        "div", class_="priceUp")
-    return float(div.text) if div else 0.0
+def extract_change(cells):
+    values = cells.astype(str).str.extract(PRICE_CELL_PATTERN, expand=False)
+    values = values.str.replace(NUMBER_NOISE_PATTERN, "", regex=True)
+    return pd.to_numeric(values, errors="coerce").fillna(0.0)
 
-# Preprocess the data to be compatible with the LSTM
+# Parse the raw exchange rows into numeric daily bars indexed by date (newest first)
 
 
-def preprocess_data(days, window_size=11):  # NEEDD a load of editing
+def parse_rows(days):
     # Rename the columns for clarity
-    days.rename(columns={
+    days = days.rename(columns={
         "todaysOpen": "Open",
         "highPrice": "High",
         "lowPrice": "Low",
@@ -119,81 +405,351 @@ def preprocess_data(days, window_size=11):  # NEEDD a load of editing
         "turnOver": "Turnover",
         "noOfTrades": "NoOfTrades",
         "transactionDateStr": "Date"
-    }, inplace=True)
-
-    # Drop the 'transactionDate' & 'lastTradePrice' column (redundant with 'Date' & 'Close')
-    days.drop(['transactionDate', 'lastTradePrice'], axis=1, inplace=True)
+    })
 
     # Ensure 'Date' is in datetime format
     days["Date"] = pd.to_datetime(
         days["Date"], format="%Y-%m-%d", errors='coerce')
 
-    # Move 'Date' to the first column
-    cols = days.columns.tolist()
-    cols.insert(0, cols.pop(cols.index('Date')))
-    days = days[cols]
+    # Keep 'Date' and the bar columns only ('transactionDate' & 'lastTradePrice' are redundant with 'Date' & 'Close')
+    days = days[['Date'] + BAR_COLUMNS].copy()
 
     # Apply the extraction function to the 'change' and 'changePercent' columns
-    days["change"] = days["change"].apply(extract_change)
-    days["changePercent"] = days["changePercent"].apply(
-        lambda s: extract_change(s.strip('%')))
+    days["change"] = extract_change(days["change"])
+    days["changePercent"] = extract_change(days["changePercent"])
 
     # Ensure all numeric columns are in float format
-    for col in ["Open", "High", "Low", "Close", "change", "changePercent"]:
+    for col in ["Open", "High", "Low", "Close"]:
         days[col] = pd.to_numeric(days[col], errors="coerce")
 
     for col in ["Volume", "Turnover", "NoOfTrades"]:
-        days[col] = (
-            days[col]
-            .astype(str)
-            .str.replace(",", "", regex=False)  # Remove commas
-            .str.replace("-", "", regex=False)  # Remove dashes
-            # Remove non-breaking spaces
-            .str.replace("\u00a0", "", regex=False)
-            .str.strip()  # Remove leading/trailing whitespace
-        )
-        days[col] = pd.to_numeric(days[col], errors="coerce")
+        # Remove commas, dashes, non-breaking spaces and whitespace in one pass
+        days[col] = pd.to_numeric(days[col].astype(str).str.replace(
+            THOUSANDS_NOISE_PATTERN, "", regex=True), errors="coerce")
 
     # Set 'Date' as the index
     days.set_index('Date', inplace=True)
 
+    return days.sort_index(ascending=False)
+
+# Preprocess the data to be compatible with the LSTM
+
+
+def preprocess_data(days, window_size=11):
+    days = parse_rows(days)
+
     # Take the latest 10 results only + the actual day (FOR TESTING)
     days = days.head(window_size)
 
     return days
 
+# Download the raw exchange rows of one entity between two dates ('DD-MM-YYYY')
 
-def fetch_data(start_date, end_date, entity_id="2222", max_records=1500):
-    headers = {
-        'accept': 'application/json, text/javascript, */*; q=0.01',
-        'content-type': 'application/x-www-form-urlencoded; charset=UTF-8',
-        'origin': 'https://www.saudiexchange.sa',
-        'referer': 'https://www.saudiexchange.sa/wps/portal/saudiexchange/newsandreports/reports-publications/historical-reports/!ut/p/z1/04_Sj9CPykssy0xPLMnMz0vMAfIjo8ziTR3NDIw8LAz8DTxCnA3MDILdzUJDLAyNXE30I4EKzHEqMDTTDyekoCA7zRMAIkY09Q!!/',
-        'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
-        'x-requested-with': 'XMLHttpRequest',
-    }
 
-    cookies = get_fresh_cookies()
+def download_rows(start_date, end_date, entity_id="2222", max_records=1500, sector_id=DEFAULT_SECTOR):
+    transport = get_transport()
 
-    url = 'https://www.saudiexchange.sa/wps/portal/saudiexchange/newsandreports/reports-publications/historical-reports/!ut/p/z1/lY9NDsIgFITP0gMYRhRki8ZSE2uLFK1sDAtjSBRdGM9v4078SZ3dS755M0McaYmL_h6O_hYu0Z-6e-f4nkkOWghUKJoZOIzithFDOh-T7SsgSsWhV1JXdMKgNiDuLz9MzaDzuhwtsYYC7-fHF8ke-S5BtBVdA5NPmQCFQQp8mJh8eN_wBH6UNIdIrmdrW4TFQGbZA6as4Ag!/p0/IZ7_5A602H80O0HTC060SG6UT81216=CZ6_5A602H80O0HTC060SG6UT812E4=NJpopulateCompanyDetails=/'
+    # Never request more rows per page than the caller needs
+    length = min(PAGE_SIZE, max_records)
 
     all_rows = []
-    for start in range(0, max_records, 100):
-        payload = build_payload(start, start_date, end_date)
-        payload['selectedEntity'] = entity_id  # Dynamic injection
-        res = requests.post(url, headers=headers,
-                            cookies=cookies, data=payload)
-        res.raise_for_status()
-        rows = res.json().get("data", [])
-        if not rows:
-            break
+    for start in range(0, max_records, length):
+        if transport.rate_limited:
+            get_rate_limiter().wait()  # polite delay
+        rows, _ = fetch_page(transport, start, start_date,
+                             end_date, entity_id, length, sector_id)
         all_rows.extend(rows)
-        time.sleep(1)  # polite delay
+
+        # A short page is the last one
+        if len(rows) < length:
+            break
+
+    return all_rows[:max_records]
+
+# Download one page of raw rows, returns the rows and the total number of rows reported by the
+# exchange (None if missing)
+
+
+def fetch_page(transport, start, start_date, end_date, entity_id, length=PAGE_SIZE, sector_id=DEFAULT_SECTOR):
+    payload = build_payload(start, start_date, end_date, length, sector_id)
+    payload['selectedEntity'] = entity_id  # Dynamic injection
+    response = transport.fetch(payload)
+
+    total = response.get("recordsTotal")
+    return response.get("data", []), None if total is None else int(total)
+
+# Async version of download_rows: the first page is requested alone, then the remaining pages
+# (known from the reported total, or only if the first page was full) are requested concurrently,
+# in waves of 'concurrency' pages under the shared rate limit, without blocking the event loop
+
+
+async def download_rows_async(start_date, end_date, entity_id="2222", max_records=1500, concurrency=4,
+                              sector_id=DEFAULT_SECTOR):
+    transport = get_transport()
+    limiter = get_rate_limiter()
+
+    # Never request more rows per page than the caller needs
+    length = min(PAGE_SIZE, max_records)
+
+    async def fetch(start):
+        if transport.rate_limited:
+            await limiter.acquire()
+        return await asyncio.to_thread(fetch_page, transport, start, start_date, end_date, entity_id, length,
+                                       sector_id)
+
+    all_rows, total = await fetch(0)
+
+    # A short first page is the only one
+    if len(all_rows) < length:
+        return all_rows[:max_records]
+
+    last_row = max_records if total is None else min(max_records, total)
+    page_starts = list(range(length, last_row, length))
+
+    for i in range(0, len(page_starts), concurrency):
+        pages = await asyncio.gather(*(fetch(start) for start in page_starts[i:i + concurrency]))
+
+        for rows, _ in pages:
+            all_rows.extend(rows)
+
+            # A short page is the last one, ignore the (empty) pages after it
+            if len(rows) < length:
+                return all_rows[:max_records]
+
+    return all_rows[:max_records]
+
+# Open the local bar store
+
+
+@contextmanager
+def open_market_db():
+    conn = sqlite3.connect(MARKET_DB)
+    try:
+        with conn:
+            conn.executescript(MARKET_SCHEMA)
+            yield conn
+    finally:
+        conn.close()
+
+# Return the sub-ranges of [start, end] (dates) not covered by previous downloads
+
+
+def missing_ranges(conn, entity_id, start, end):
+    covered = conn.execute(
+        "SELECT start, end FROM coverage WHERE entity_id = ? AND end >= ? AND start <= ? ORDER BY start",
+        (entity_id, start.isoformat(), end.isoformat())).fetchall()
+
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        covered_start = date.fromisoformat(covered_start)
+        covered_end = date.fromisoformat(covered_end)
+        if covered_start > cursor:
+            gaps.append((cursor, min(covered_start - timedelta(days=1), end)))
+        cursor = max(cursor, covered_end + timedelta(days=1))
+        if cursor > end:
+            break
+
+    if cursor <= end:
+        gaps.append((cursor, end))
+
+    return gaps
+
+# Store downloaded bars and remember which dates were covered
+
+
+def store_bars(conn, entity_id, bars, start, end):
+    rows = [(entity_id, bar_date.strftime("%Y-%m-%d"), *values)
+            for bar_date, values in zip(bars.index, bars[BAR_COLUMNS].itertuples(index=False))
+            if not pd.isna(bar_date)]
+    conn.executemany(
+        f"INSERT OR REPLACE INTO bars (entity_id, Date, {', '.join(BAR_COLUMNS)}) "
+        f"VALUES ({', '.join(['?'] * (len(BAR_COLUMNS) + 2))})", rows)
+
+    # Today's bar may still change, so only past dates count as covered
+    end = min(end, date.today() - timedelta(days=1))
+    if start <= end:
+        conn.execute("INSERT INTO coverage (entity_id, start, end) VALUES (?, ?, ?)",
+                     (entity_id, start.isoformat(), end.isoformat()))
+
+# Count stored bars between two dates
+
+
+def count_bars(conn, entity_id, start, end):
+    return conn.execute(
+        "SELECT COUNT(*) FROM bars WHERE entity_id = ? AND Date BETWEEN ? AND ?",
+        (entity_id, start.isoformat(), end.isoformat())).fetchone()[0]
+
+# Read stored bars between two dates (newest first)
+
+
+def load_bars(conn, entity_id, start, end):
+    bars = pd.read_sql_query(
+        f"SELECT Date, {', '.join(BAR_COLUMNS)} FROM bars "
+        "WHERE entity_id = ? AND Date BETWEEN ? AND ? ORDER BY Date DESC",
+        conn, params=(entity_id, start.isoformat(), end.isoformat()))
+    bars["Date"] = pd.to_datetime(bars["Date"], format="%Y-%m-%d")
+
+    return bars.set_index('Date')
+
+
+# Parse downloaded rows and store them for the downloaded date range
+
+
+def save_download(conn, entity_id, rows, gap_start, gap_end, max_records):
+    bars = parse_rows(pd.DataFrame(rows)) if rows else pd.DataFrame(
+        columns=BAR_COLUMNS)
+
+    # If the download hit max_records, older dates of the gap are still missing
+    if len(rows) >= max_records and not bars.empty:
+        gap_start = bars.index.min().date()
+
+    store_bars(conn, entity_id, bars, gap_start, gap_end)
+
+
+# Plan of fetch_data, shared by the sync and async versions: yields the (start_date, end_date)
+# gaps to download, newest first, expects the downloaded rows to be sent back, and returns the bars
+
+
+def fetch_data_plan(start_date, end_date, entity_id, max_records, window_size):
+    start = datetime.strptime(start_date, "%d-%m-%Y").date()
+    end = datetime.strptime(end_date, "%d-%m-%Y").date()
+
+    # Only request the date ranges that are not in the local store yet (newest first)
+    with open_market_db() as conn:
+        gaps = missing_ranges(conn, entity_id, start, end)
+
+    for gap_start, gap_end in reversed(gaps):
+        # Older gaps are not needed once the window is filled by newer bars
+        with open_market_db() as conn:
+            if window_size is not None and count_bars(conn, entity_id, gap_end + timedelta(days=1), end) >= window_size:
+                break
+
+        rows = yield gap_start.strftime("%d-%m-%Y"), gap_end.strftime("%d-%m-%Y")
+
+        with open_market_db() as conn:
+            save_download(conn, entity_id, rows,
+                          gap_start, gap_end, max_records)
 
     # past '30' days
-    past_days = pd.DataFrame(all_rows)
+    with open_market_db() as conn:
+        past_days = load_bars(conn, entity_id, start, end)
+
+    # return '10' days only (window size) + the actual day (every day if window_size is None)
+    return past_days if window_size is None else past_days.head(window_size)
+
+# Run a plan generator, answering each of its requests with step(request), and return its result
+
+
+def run_plan(plan, step):
+    try:
+        request = next(plan)
+        while True:
+            request = plan.send(step(request))
+    except StopIteration as done:
+        return done.value
+
+# Async version of run_plan, with an awaitable step
+
+
+async def run_plan_async(plan, step):
+    try:
+        request = next(plan)
+        while True:
+            request = plan.send(await step(request))
+    except StopIteration as done:
+        return done.value
+
+
+def fetch_data(start_date, end_date, entity_id="2222", max_records=1500, window_size=11, sector_id=DEFAULT_SECTOR):
+    return run_plan(fetch_data_plan(start_date, end_date, entity_id, max_records, window_size),
+                    lambda gap: download_rows(*gap, entity_id, max_records, sector_id))
+
+# Awaitable version of fetch_data, so the server keeps serving requests during downloads
+
+
+async def fetch_data_async(start_date, end_date, entity_id="2222", max_records=1500, window_size=11,
+                           sector_id=DEFAULT_SECTOR):
+    return await run_plan_async(fetch_data_plan(start_date, end_date, entity_id, max_records, window_size),
+                                lambda gap: download_rows_async(*gap, entity_id, max_records, sector_id=sector_id))
+
+# Calendar span (days) expected to contain 'n_days' trading days (Sunday to Thursday, plus a holiday margin)
 
-    # preprocess the data and return '10' days only (window size)
-    past_days = preprocess_data(past_days)
+
+def trading_span(n_days):
+    return math.ceil(n_days * 7 / 5) + HOLIDAY_MARGIN
+
+# Plan of fetch_latest, shared by the sync and async versions: yields the start date of the span to
+# fetch, expects the fetched bars to be sent back, and returns the bars of the last span
+
+
+def fetch_latest_plan(end_date, n_days):
+    end = datetime.strptime(end_date, "%d-%m-%Y")
+    span = trading_span(n_days)
+
+    for _ in range(MAX_SPAN_DOUBLINGS):
+        past_days = yield (end - timedelta(days=span - 1)).strftime("%d-%m-%Y")
+        if len(past_days) >= n_days:
+            break
+        span *= 2
 
     return past_days
+
+# Fetch the latest 'n_days' trading days up to end_date ('DD-MM-YYYY'), requesting only
+# n_days rows over the shortest date span, widened only when holidays left it short
+
+
+def fetch_latest(end_date, n_days, entity_id="2222", sector_id=DEFAULT_SECTOR):
+    return run_plan(fetch_latest_plan(end_date, n_days),
+                    lambda start_date: fetch_data(start_date, end_date, entity_id, max_records=n_days,
+                                                  window_size=n_days, sector_id=sector_id))
+
+# Awaitable version of fetch_latest
+
+
+async def fetch_latest_async(end_date, n_days, entity_id="2222", sector_id=DEFAULT_SECTOR):
+    return await run_plan_async(fetch_latest_plan(end_date, n_days),
+                                lambda start_date: fetch_data_async(start_date, end_date, entity_id,
+                                                                    max_records=n_days, window_size=n_days,
+                                                                    sector_id=sector_id))
+
+# Load many entities at once, given as {entity_id: sector_id} (or (entity_id, sector_id) pairs).
+# Entities are fetched with bounded concurrency over the shared session; a failing entity is
+# reported in the errors dict instead of aborting the batch.
+# Returns one long-format frame indexed by (entity_id, Date) and the errors per entity.
+
+
+async def fetch_bulk_async(entities, start_date, end_date, max_records=1500, window_size=None, max_concurrency=4):
+    entities = dict(entities)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def load(entity_id, sector_id):
+        async with semaphore:
+            return await fetch_data_async(start_date, end_date, entity_id, max_records, window_size, sector_id)
+
+    results = await asyncio.gather(*(load(entity_id, sector_id) for entity_id, sector_id in entities.items()),
+                                   return_exceptions=True)
+
+    frames = {}
+    errors = {}
+    for entity_id, result in zip(entities, results):
+        if isinstance(result, Exception):
+            print(f"Failed to load entity {entity_id}: {result}")
+            errors[entity_id] = result
+        else:
+            frames[entity_id] = result
+
+    if frames:
+        bars = pd.concat(frames, names=['entity_id', 'Date'])
+    else:
+        bars = pd.DataFrame(columns=BAR_COLUMNS, index=pd.MultiIndex.from_arrays(
+            [[], pd.DatetimeIndex([])], names=['entity_id', 'Date']))
+
+    print(f"Loaded {len(frames)}/{len(entities)} entities ({len(bars)} bars).")
+    return bars, errors
+
+# Blocking version of fetch_bulk_async (for scripts, e.g. the morning sector screening)
+
+
+def fetch_bulk(entities, start_date, end_date, max_records=1500, window_size=None, max_concurrency=4):
+    return asyncio.run(fetch_bulk_async(entities, start_date, end_date, max_records, window_size, max_concurrency))
@@ -0,0 +1,106 @@
+import sqlite3
+from contextlib import contextmanager
+from datetime import date
+import pandas as pd
+
+# Local archive of scraped tweets per search query, so overlapping date windows are scraped only once
+
+TWEET_ARCHIVE_DB = 'tweet_archive.db'
+
+# Columns of a tweets frame, as built by sentiment_analysis.tweet_row
+TWEET_COLUMNS = ["Tweet ID", "Date", "Username",
+                 "Display Name", "Followers", "Content", "Tweet URL"]
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    query TEXT NOT NULL,
+    tweet_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    username TEXT,
+    display_name TEXT,
+    followers INTEGER,
+    content TEXT,
+    url TEXT,
+    PRIMARY KEY (query, tweet_id)
+);
+CREATE INDEX IF NOT EXISTS idx_tweets_query_date ON tweets (query, date);
+CREATE TABLE IF NOT EXISTS coverage (
+    query TEXT NOT NULL,
+    since TEXT NOT NULL,
+    until TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_coverage_query ON coverage (query);
+"""
+
+
+@contextmanager
+def open_archive():
+    conn = sqlite3.connect(TWEET_ARCHIVE_DB, timeout=30)
+    try:
+        with conn:
+            conn.executescript(ARCHIVE_SCHEMA)
+
+        # Commit on success, rollback on failure
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+# Return the (since, until) sub-ranges of [since, until) ('YYYY-MM-DD', until excluded) not covered
+# by previous scrapes of a query
+
+
+def missing_windows(conn, query, since, until):
+    covered = conn.execute(
+        "SELECT since, until FROM coverage WHERE query = ? AND until > ? AND since < ? ORDER BY since",
+        (query, since, until)).fetchall()
+
+    windows = []
+    cursor = since
+    for covered_since, covered_until in covered:
+        if covered_since > cursor:
+            windows.append((cursor, min(covered_since, until)))
+        cursor = max(cursor, covered_until)
+        if cursor >= until:
+            break
+
+    if cursor < until:
+        windows.append((cursor, until))
+
+    return windows
+
+# Store scraped tweets (a tweets frame) of a query
+
+
+def store_tweets(conn, query, tweets):
+    rows = [(query, int(tweet_id), pd.Timestamp(tweet_date).isoformat(), username, display_name,
+             None if pd.isna(followers) else int(followers), content, url)
+            for tweet_id, tweet_date, username, display_name, followers, content, url
+            in tweets[TWEET_COLUMNS].itertuples(index=False)]
+    conn.executemany(
+        "INSERT OR REPLACE INTO tweets (query, tweet_id, date, username, display_name, followers, content, url) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+# Record that [since, until) was completely scraped
+
+
+def mark_synced(conn, query, since, until):
+    # Today's tweets are still coming, so only past days count as synced
+    until = min(until, date.today().isoformat())
+    if since < until:
+        conn.execute("INSERT INTO coverage (query, since, until) VALUES (?, ?, ?)",
+                     (query, since, until))
+
+# Read the archived tweets of a query in [since, until) as a tweets frame (newest first, at most 'limit'
+# after skipping 'offset')
+
+
+def load_tweets(conn, query, since, until, limit=None, offset=0):
+    tweets = pd.read_sql_query(
+        "SELECT tweet_id, date, username, display_name, followers, content, url FROM tweets "
+        "WHERE query = ? AND date >= ? AND date < ? ORDER BY date DESC, tweet_id DESC LIMIT ? OFFSET ?",
+        conn, params=(query, since, until, -1 if limit is None else limit, offset))
+    tweets.columns = TWEET_COLUMNS
+    tweets["Date"] = pd.to_datetime(tweets["Date"], format="ISO8601")
+
+    return tweets